@@ -0,0 +1,412 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, unquote, urlparse
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from .database import SQLITE_PRAGMAS, SQLITE_TIMEOUT
+from .metrics import registry
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'sqlite': 'core.caches.SQLiteCache',
+    # Нужен пакет django-redis.
+    'redis': 'django_redis.cache.RedisCache',
+    # Нужен пакет python-memcached.
+    'memcached': 'django.core.cache.backends.memcached.MemcachedCache',
+}
+# Бэкенды по умолчанию держат всего 300 ключей.
+CACHE_MAX_ENTRIES: int = 100000
+# Сколько секунд значение живёт в памяти процесса: столько другие
+# процессы могут видеть старую копию после изменения ключа.
+LOCAL_TIMEOUT: float = 5.0
+# Раз в столько записей SQLiteCache удаляет истёкшие ключи.
+CULL_EVERY: int = 100
+# Ограничение SQLite на число параметров запроса.
+SQLITE_MAX_VARIABLES: int = 500
+PICKLE_PROTOCOL = pickle.HIGHEST_PROTOCOL
+
+_MISSING = object()
+
+# LRU процесса и их блокировки по имени кэша, как _caches в
+# LocMemCache: Django создаёт бэкенд в каждом потоке заново.
+_local_caches = {}
+_local_locks = {}
+
+
+def cache_config(url, base_dir, shared_only=()):
+    """Настройки кэша из URL.
+
+    locmem://, file:///cache, sqlite:///cache.sqlite3 — пути
+    относительно base_dir, redis://host:6379/0, memcached://host:11211.
+    Параметры timeout, max_entries и key_prefix общие, local_size
+    включает LRU в памяти процесса перед общим кэшем, local_timeout —
+    срок жизни в нём. Ключи с префиксами shared_only читаются только
+    из общего кэша. Остальные параметры уходят в OPTIONS.
+    """
+    parsed = urlparse(url)
+    backend = BACKENDS.get(parsed.scheme)
+    if backend is None:
+        raise ImproperlyConfigured(
+            f'CACHE_URL: неизвестный кэш {parsed.scheme!r}'
+        )
+    options = dict(parse_qsl(parsed.query))
+    local_size = int(options.pop('local_size', 0))
+    local_timeout = float(options.pop('local_timeout', LOCAL_TIMEOUT))
+    shared = {
+        'BACKEND': backend,
+        'KEY_PREFIX': options.pop('key_prefix', ''),
+    }
+    if 'timeout' in options:
+        shared['TIMEOUT'] = int(options.pop('timeout'))
+    if parsed.scheme in ('file', 'sqlite'):
+        shared['LOCATION'] = os.path.join(
+            base_dir, unquote(parsed.path[1:])
+        )
+    elif parsed.scheme == 'redis':
+        shared['LOCATION'] = parsed._replace(query='').geturl()
+    else:
+        shared['LOCATION'] = parsed.netloc
+    if parsed.scheme != 'memcached':
+        options['MAX_ENTRIES'] = int(
+            options.pop('max_entries', CACHE_MAX_ENTRIES)
+        )
+    shared['OPTIONS'] = options
+    return {
+        'BACKEND': 'core.caches.TieredCache',
+        'OPTIONS': {
+            'SHARED': shared,
+            'LOCAL_SIZE': local_size,
+            'LOCAL_TIMEOUT': local_timeout,
+            'SHARED_ONLY': tuple(shared_only),
+        },
+    }
+
+
+class SQLiteCache(BaseCache):
+    """Кэш в файле SQLite, общий для процессов одной машины.
+
+    Не требует отдельного сервиса; запись сериализуется блокировкой
+    SQLite, поэтому incr и add атомарны между процессами.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = location
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            connection = sqlite3.connect(
+                self.path, timeout=SQLITE_TIMEOUT, isolation_level=None
+            )
+            for pragma, value in SQLITE_PRAGMAS.items():
+                connection.execute(f'PRAGMA {pragma} = {value}')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, '
+                'value BLOB NOT NULL, expires REAL)'
+            )
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)'
+            )
+            self._local.connection = connection
+        return connection
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def get(self, key, default=None, version=None):
+        row = self._connection().execute(
+            'SELECT value FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self._key(key, version), time.time())
+        ).fetchone()
+        return default if row is None else pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        found = {}
+        names = list(keys)
+        for start in range(0, len(names), SQLITE_MAX_VARIABLES):
+            chunk = names[start:start + SQLITE_MAX_VARIABLES]
+            rows = self._connection().execute(
+                'SELECT key, value FROM cache WHERE key IN ({}) '
+                'AND (expires IS NULL OR expires > ?)'.format(
+                    ', '.join('?' * len(chunk))
+                ),
+                chunk + [time.time()]
+            )
+            for name, value in rows:
+                found[keys[name]] = pickle.loads(value)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._connection().execute(
+            'INSERT OR REPLACE INTO cache VALUES (?, ?, ?)',
+            (self._key(key, version), pickle.dumps(value, PICKLE_PROTOCOL),
+             self.get_backend_timeout(timeout))
+        )
+        self._wrote()
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        connection = self._connection()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.executemany(
+                'INSERT OR REPLACE INTO cache VALUES (?, ?, ?)',
+                [
+                    (self._key(key, version),
+                     pickle.dumps(value, PICKLE_PROTOCOL), expires)
+                    for key, value in data.items()
+                ]
+            )
+        self._wrote(len(data))
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        cursor = self._connection().execute(
+            'INSERT INTO cache VALUES (?, ?, ?) ON CONFLICT (key) DO UPDATE '
+            'SET value = excluded.value, expires = excluded.expires '
+            'WHERE cache.expires <= ?',
+            (self._key(key, version), pickle.dumps(value, PICKLE_PROTOCOL),
+             self.get_backend_timeout(timeout), time.time())
+        )
+        self._wrote()
+        return cursor.rowcount > 0
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        cursor = self._connection().execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), self._key(key, version),
+             time.time())
+        )
+        return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        name = self._key(key, version)
+        connection = self._connection()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            row = connection.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (name, time.time())
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (pickle.dumps(value, PICKLE_PROTOCOL), name)
+            )
+        return value
+
+    def delete(self, key, version=None):
+        cursor = self._connection().execute(
+            'DELETE FROM cache WHERE key = ?', (self._key(key, version),)
+        )
+        return cursor.rowcount > 0
+
+    def has_key(self, key, version=None):
+        return self.get(key, _MISSING, version) is not _MISSING
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def _wrote(self, count=1):
+        self._writes += count
+        if self._writes >= CULL_EVERY:
+            self._writes = 0
+            self.cull()
+
+    def cull(self):
+        """Удаляет истёкшие ключи, а сверх MAX_ENTRIES — долю
+        1/CULL_FREQUENCY ключей, истекающих раньше других.
+        """
+        connection = self._connection()
+        connection.execute(
+            'DELETE FROM cache WHERE expires <= ?', (time.time(),)
+        )
+        count = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count <= self._max_entries:
+            return
+        excess = (
+            count if self._cull_frequency == 0
+            else max(count - self._max_entries, count // self._cull_frequency)
+        )
+        connection.execute(
+            'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+            'ORDER BY expires IS NULL, expires LIMIT ?)', (excess,)
+        )
+
+
+class TieredCache(BaseCache):
+    """Общий кэш с LRU в памяти процесса перед ним.
+
+    Запись идёт в оба уровня, поэтому процесс сразу видит свои
+    изменения, а чужие — не позже чем через LOCAL_TIMEOUT. Ключи с
+    префиксами SHARED_ONLY, например версии страниц, читаются только
+    из общего кэша. Попадания и промахи уровней считаются в метрике
+    yatube_cache_requests_total.
+
+    LRU общий для всех потоков процесса с тем же LOCATION, а без него —
+    с тем же общим кэшем.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        shared = dict(options['SHARED'])
+        backend_path = shared.pop('BACKEND')
+        shared_location = shared.pop('LOCATION', '')
+        self.shared = import_string(backend_path)(shared_location, shared)
+        self.local_size = options.get('LOCAL_SIZE', 0)
+        self.local_timeout = options.get('LOCAL_TIMEOUT', LOCAL_TIMEOUT)
+        self.shared_only = tuple(options.get('SHARED_ONLY', ()))
+        self.clock = time.monotonic
+        name = location or f'{backend_path}:{shared_location}'
+        self._local = _local_caches.setdefault(name, OrderedDict())
+        self._lock = _local_locks.setdefault(name, threading.Lock())
+
+    def _count(self, tier, hits, misses):
+        for result, value in (('hit', hits), ('miss', misses)):
+            if value:
+                registry.inc('yatube_cache_requests_total', (
+                    ('tier', tier), ('result', result)
+                ), value)
+
+    def _cached_locally(self, key):
+        return bool(self.local_size) and not key.startswith(self.shared_only)
+
+    def _local_get(self, name):
+        with self._lock:
+            item = self._local.get(name)
+            if item is None:
+                return _MISSING
+            pickled, expires = item
+            if expires <= self.clock():
+                del self._local[name]
+                return _MISSING
+            self._local.move_to_end(name)
+        # Каждый получает свою копию, как из общего кэша: иначе
+        # изменение ответа одного запроса попало бы в другой.
+        return pickle.loads(pickled)
+
+    def _local_set(self, name, value, timeout=DEFAULT_TIMEOUT):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.shared.default_timeout
+        lifetime = self.local_timeout
+        if timeout is not None:
+            lifetime = min(lifetime, timeout)
+        if lifetime <= 0:
+            self._local_delete(name)
+            return
+        item = (pickle.dumps(value, PICKLE_PROTOCOL), self.clock() + lifetime)
+        with self._lock:
+            self._local[name] = item
+            self._local.move_to_end(name)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+
+    def _local_delete(self, name):
+        with self._lock:
+            self._local.pop(name, None)
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        found = {}
+        names = {}
+        for key in keys:
+            if self._cached_locally(key):
+                names[key] = self.shared.make_key(key, version=version)
+                value = self._local_get(names[key])
+                if value is not _MISSING:
+                    found[key] = value
+        self._count('local', len(found), len(names) - len(found))
+        missing = [key for key in keys if key not in found]
+        if not missing:
+            return found
+        shared = self.shared.get_many(missing, version=version)
+        self._count('shared', len(shared), len(missing) - len(shared))
+        for key, value in shared.items():
+            if key in names:
+                self._local_set(names[key], value)
+        found.update(shared)
+        return found
+
+    def _write_through(self, key, value, version, timeout=DEFAULT_TIMEOUT):
+        if self._cached_locally(key):
+            self._local_set(
+                self.shared.make_key(key, version=version), value, timeout
+            )
+
+    def _forget(self, key, version):
+        if self._cached_locally(key):
+            self._local_delete(self.shared.make_key(key, version=version))
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version)
+        self._write_through(key, value, version, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version)
+        for key, value in data.items():
+            if key in failed:
+                self._forget(key, version)
+            else:
+                self._write_through(key, value, version, timeout)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version)
+        if added:
+            self._write_through(key, value, version, timeout)
+        else:
+            self._forget(key, version)
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        self._forget(key, version)
+        value = self.shared.incr(key, delta, version)
+        self._write_through(key, value, version)
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self._forget(key, version)
+        return self.shared.touch(key, timeout, version)
+
+    def delete(self, key, version=None):
+        self._forget(key, version)
+        return self.shared.delete(key, version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._forget(key, version)
+        self.shared.delete_many(keys, version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, _MISSING, version) is not _MISSING
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+        self.shared.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
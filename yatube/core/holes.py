@@ -0,0 +1,33 @@
+import re
+from urllib.parse import parse_qsl, urlencode
+
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+HOLE_MARKER: str = '<!--hole:{template}?{params}-->'
+# Текст пользователей экранируется, поэтому подделать метку нельзя.
+HOLE_PATTERN = re.compile(r'<!--hole:([\w/.-]+)\?([^<>]*?)-->')
+
+
+def hole_marker(template_name, params):
+    return mark_safe(HOLE_MARKER.format(
+        template=template_name, params=urlencode(params)
+    ))
+
+
+def fill_holes(request, response):
+    """Заменяет метки фрагментами для пользователя запроса.
+
+    Фрагмент рендерится с параметрами метки и контекстными
+    процессорами, то есть видит user и request.
+    """
+    content = response.content.decode(response.charset)
+    if '<!--hole:' not in content:
+        return response
+    response.content = HOLE_PATTERN.sub(
+        lambda match: render_to_string(
+            match[1], dict(parse_qsl(match[2])), request=request
+        ),
+        content
+    )
+    return response
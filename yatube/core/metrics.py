@@ -0,0 +1,211 @@
+import bisect
+import threading
+import time
+
+from django.template.backends.django import DjangoTemplates, Template
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+METRICS = {
+    'yatube_requests_total': (
+        'counter', 'Число запросов по view и статусу'
+    ),
+    'yatube_request_duration_seconds': (
+        'histogram', 'Время ответа view'
+    ),
+    'yatube_sampled_requests_total': (
+        'counter', 'Запросы с замером БД и шаблонов'
+    ),
+    'yatube_db_queries_total': (
+        'counter', 'Число запросов к БД в замеренных запросах'
+    ),
+    'yatube_db_seconds_total': (
+        'counter', 'Время запросов к БД в замеренных запросах'
+    ),
+    'yatube_template_seconds_total': (
+        'counter', 'Время рендеринга шаблонов в замеренных запросах'
+    ),
+    'yatube_cache_page_total': (
+        'counter',
+        'Страницы из кэша (hit), устаревшие на время пересчёта (stale) '
+        'и отрендеренные (miss)'
+    ),
+    'yatube_throttled_total': (
+        'counter', 'Запросы, отклонённые ограничением частоты, по ключам'
+    ),
+    'yatube_cache_requests_total': (
+        'counter', 'Чтения ключей кэша по уровням: попадания и промахи'
+    ),
+}
+
+
+def _add_shard(total, shard):
+    counters, histograms = total
+    shard_counters, shard_histograms = shard
+    for key, value in shard_counters.copy().items():
+        counters[key] = counters.get(key, 0) + value
+    for key, values in shard_histograms.copy().items():
+        summed = histograms.setdefault(key, [0] * len(values))
+        for index, value in enumerate(list(values)):
+            summed[index] += value
+
+
+class Registry:
+    """Метрики процесса без блокировок на запись.
+
+    Каждый поток пишет в свой шард, а collect() складывает шарды
+    при выдаче /metrics. Шарды завершившихся потоков сливаются
+    в общий итог, так что их не больше, чем живых потоков.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = {}
+        self._finished = ({}, {})
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = ({}, {})
+            with self._lock:
+                self._merge_finished()
+                self._shards[threading.current_thread()] = shard
+        return shard
+
+    def _merge_finished(self):
+        # Завершившийся поток в шард уже не пишет. Вызывать под _lock.
+        for thread in [
+            thread for thread in self._shards if not thread.is_alive()
+        ]:
+            _add_shard(self._finished, self._shards.pop(thread))
+
+    def inc(self, name, labels, value=1):
+        counters, _ = self._shard()
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        _, histograms = self._shard()
+        key = (name, labels)
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+        histogram[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        histogram[-1] += value
+
+    def collect(self):
+        """Возвращает (счётчики, гистограммы), сложенные по шардам."""
+        total = ({}, {})
+        with self._lock:
+            self._merge_finished()
+            _add_shard(total, self._finished)
+            for shard in list(self._shards.values()):
+                _add_shard(total, shard)
+        return total
+
+    def clear(self):
+        with self._lock:
+            for counters, histograms in [
+                self._finished, *self._shards.values()
+            ]:
+                counters.clear()
+                histograms.clear()
+
+
+registry = Registry()
+
+
+def format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (
+        '{}="{}"'.format(name, str(value).replace('\\', r'\\').replace(
+            '"', r'\"'
+        ).replace('\n', r'\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def render_metrics(collected=None):
+    """Метрики в текстовом формате Prometheus."""
+    counters, histograms = collected or registry.collect()
+    lines = []
+    for name, (kind, description) in METRICS.items():
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} {kind}']
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f'{name}{format_labels(labels)} {value}')
+        for (metric, labels), values in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            bounds = [str(bound) for bound in LATENCY_BUCKETS] + ['+Inf']
+            for bound, count in zip(bounds, values[:-1]):
+                cumulative += count
+                lines.append(
+                    f'{name}_bucket{format_labels(labels, le=bound)} '
+                    f'{cumulative}'
+                )
+            lines.append(f'{name}_sum{format_labels(labels)} {values[-1]}')
+            lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+class RequestTimings(threading.local):
+    """Замеры текущего запроса; active — запрос попал в выборку."""
+    active = False
+    depth = 0
+    queries = 0
+    db_seconds = 0.0
+    template_seconds = 0.0
+
+    def start(self):
+        self.active = True
+        self.depth = self.queries = 0
+        self.db_seconds = self.template_seconds = 0.0
+
+    def stop(self):
+        self.active = False
+
+
+timings = RequestTimings()
+
+
+def time_query(execute, sql, params, many, context):
+    """Обёртка connection.execute_wrapper для замера запросов."""
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.queries += 1
+        timings.db_seconds += time.perf_counter() - started
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        if not timings.active:
+            return super().render(context, request)
+        # Вложенный render_to_string уже учтён во внешнем шаблоне.
+        timings.depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timings.depth -= 1
+            if not timings.depth:
+                timings.template_seconds += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Бэкенд шаблонов Django с замером времени рендеринга."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
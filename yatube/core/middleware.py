@@ -0,0 +1,62 @@
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import registry, time_query, timings
+
+METRICS_SAMPLE_RATE: float = 1.0
+
+
+class MetricsMiddleware:
+    """Собирает метрики запросов для /metrics.
+
+    Время ответа и статусы считаются для всех запросов, а запросы
+    к БД и рендеринг шаблонов — для доли METRICS_SAMPLE_RATE.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(
+            settings, 'METRICS_SAMPLE_RATE', METRICS_SAMPLE_RATE
+        )
+
+    def __call__(self, request):
+        sampled = random.random() < self.sample_rate
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            if sampled:
+                timings.start()
+                stack.callback(timings.stop)
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(time_query)
+                    )
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+        self.record(request, response, duration, sampled)
+        return response
+
+    def record(self, request, response, duration, sampled):
+        match = request.resolver_match
+        view = (('view', match.view_name if match else 'unmatched'),)
+        registry.inc('yatube_requests_total', view + (
+            ('method', request.method), ('status', response.status_code)
+        ))
+        registry.observe('yatube_request_duration_seconds', view, duration)
+        # posts.cache.cache_feed отмечает, откуда взят ответ.
+        result = getattr(request, 'page_cache_result', None)
+        if result is not None:
+            registry.inc(
+                'yatube_cache_page_total', view + (('result', result),)
+            )
+        if sampled:
+            registry.inc('yatube_sampled_requests_total', view)
+            registry.inc('yatube_db_queries_total', view, timings.queries)
+            registry.inc('yatube_db_seconds_total', view, timings.db_seconds)
+            registry.inc(
+                'yatube_template_seconds_total', view,
+                timings.template_seconds
+            )
@@ -0,0 +1,170 @@
+import itertools
+import threading
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+PIN_COOKIE: str = 'pin_primary'
+# Сколько секунд после записи клиент читает из основной базы;
+# должно быть больше обычного отставания реплик.
+REPLICA_PIN_SECONDS: int = 10
+# Реплики, отстающие сильнее, не используются.
+REPLICA_MAX_LAG: float = 5.0
+# Как часто перемеряется отставание реплики.
+REPLICA_LAG_TTL: float = 2.0
+# Отставание по времени последней применённой транзакции; если
+# всё полученное применено, реплика не отстаёт, даже когда основная
+# база давно не писала.
+POSTGRES_LAG_SQL: str = (
+    'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() '
+    'THEN 0 ELSE COALESCE(EXTRACT(EPOCH FROM '
+    'now() - pg_last_xact_replay_timestamp()), 0) END'
+)
+
+_replica = ContextVar('replica', default=None)
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def measure_lag(alias):
+    """Отставание реплики в секундах, None — реплика недоступна."""
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor != 'postgresql':
+                # Копии SQLite не реплицируются, отставания нет.
+                cursor.execute('SELECT 1')
+                return 0.0
+            cursor.execute(POSTGRES_LAG_SQL)
+            return float(cursor.fetchone()[0])
+    except DatabaseError:
+        return None
+
+
+class ReplicaSelector:
+    """Выбирает реплику для запроса среди не отстающих.
+
+    round_robin — по очереди, least_lag — с наименьшим отставанием.
+    Отставание кэшируется в процессе на REPLICA_LAG_TTL секунд.
+    """
+
+    def __init__(self):
+        self._turns = itertools.count()
+        self._lags = {}
+        self._lock = threading.Lock()
+
+    def lag(self, alias, now):
+        with self._lock:
+            lag, measured = self._lags.get(alias, (None, None))
+        if measured is not None and now - measured < REPLICA_LAG_TTL:
+            return lag
+        with self._lock:
+            self._lags[alias] = (measure_lag(alias), now)
+            return self._lags[alias][0]
+
+    def choose(self, replicas, now):
+        max_lag = getattr(settings, 'REPLICA_MAX_LAG', REPLICA_MAX_LAG)
+        lags = {alias: self.lag(alias, now) for alias in replicas}
+        healthy = [
+            alias for alias in replicas
+            if lags[alias] is not None and lags[alias] <= max_lag
+        ]
+        if not healthy:
+            return None
+        if getattr(settings, 'REPLICA_SELECTION', 'round_robin') == (
+            'least_lag'
+        ):
+            return min(healthy, key=lags.get)
+        return healthy[next(self._turns) % len(healthy)]
+
+    def clear(self):
+        with self._lock:
+            self._lags.clear()
+
+
+selector = ReplicaSelector()
+
+
+def is_pinned(request, now):
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > now
+    except ValueError:
+        return False
+
+
+def read_primary(request):
+    """Запрос читает только из основной базы, даже под replica_reads.
+
+    Нужно для всего, что попадает в общий кэш: отстающая реплика
+    сохранила бы туда прежние данные под новыми версиями.
+    """
+    request.read_primary = True
+
+
+def choose_replica(request):
+    """Реплика для запроса или None, если читать из основной базы."""
+    replicas = get_replicas()
+    now = time.time()
+    if (not replicas or is_pinned(request, now)
+            or getattr(request, 'read_primary', False)):
+        return None
+    return selector.choose(replicas, now)
+
+
+def replica_reads(view):
+    """Направляет чтения view в реплику, если клиент недавно не писал.
+
+    Сессия и пользователь загружаются до выбора реплики: сразу после
+    входа их ещё может не быть на реплике.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.user.is_authenticated
+        token = _replica.set(choose_replica(request))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _replica.reset(token)
+    return wrapper
+
+
+def pin_primary(methods=('POST',)):
+    """После запроса-записи клиент REPLICA_PIN_SECONDS читает из
+    основной базы и видит свои изменения.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            if request.method in methods and get_replicas():
+                seconds = getattr(
+                    settings, 'REPLICA_PIN_SECONDS', REPLICA_PIN_SECONDS
+                )
+                response.set_cookie(
+                    PIN_COOKIE, str(time.time() + seconds),
+                    max_age=seconds, httponly=True, samesite='Lax'
+                )
+            return response
+        return wrapper
+    return decorator
+
+
+class ReplicaRouter:
+    """Читает из реплики, выбранной replica_reads, пишет в default."""
+
+    def db_for_read(self, model, **hints):
+        return _replica.get()
+
+    def db_for_write(self, model, **hints):
+        # Без этого объект, прочитанный из реплики, сохранился бы в неё.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии default, связи между ними допустимы.
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        return {obj1._state.db, obj2._state.db} <= databases
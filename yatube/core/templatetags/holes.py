@@ -0,0 +1,22 @@
+from django import template
+
+from ..holes import hole_marker
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, template_name, **params):
+    """Фрагмент страницы, зависящий от пользователя.
+
+    На странице, которую кэш хранит одну для всех (request.punch_holes),
+    выводится меткой, а core.holes.fill_holes подставляет вместо неё
+    фрагмент для каждого запроса. Фрагмент может опираться только на
+    params, user и request.
+    """
+    request = context.get('request')
+    if getattr(request, 'punch_holes', False):
+        return hole_marker(template_name, params)
+    fragment = context.template.engine.get_template(template_name)
+    with context.push(**params):
+        return fragment.render(context)
@@ -1,6 +1,31 @@
+import tempfile
+import threading
+import time
+from collections import OrderedDict
 from http import HTTPStatus
+from unittest.mock import patch
 
-from django.test import TestCase
+from core.caches import (CACHE_MAX_ENTRIES, SQLiteCache, TieredCache,
+                         cache_config)
+from core.database import (CONN_MAX_AGE, SQLITE_TIMEOUT, database_config,
+                           replica_configs)
+from core.metrics import registry
+from core.replicas import (PIN_COOKIE, REPLICA_MAX_LAG, REPLICA_PIN_SECONDS,
+                           ReplicaRouter, replica_reads, selector)
+from core.throttling import cache_buckets, consume, local_buckets
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import OperationalError, connection, connections
+from django.db.models import QuerySet
+from django.db.utils import ConnectionHandler
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from posts.cache import FEED_VERSION, cache_feed
+from posts.counts import feed_count
+from posts.models import Post, User, UserStats
+from posts.stats import get_stats
 
 
 class ViewTestClass(TestCase):
@@ -8,3 +33,618 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        registry.clear()
+        cache.clear()
+
+    def get_metrics(self):
+        response = self.client.get(reverse('core:metrics'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return response.content.decode()
+
+    def test_view_latency_and_queries_recorded(self):
+        """Время ответа, запросы к БД и шаблоны считаются по view."""
+        self.client.get(reverse('posts:index'))
+        metrics = self.get_metrics()
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="posts:index"} 1',
+            metrics
+        )
+        self.assertIn(
+            'yatube_requests_total{view="posts:index",method="GET",'
+            'status="200"} 1',
+            metrics
+        )
+        counters, _ = registry.collect()
+        labels = (('view', 'posts:index'),)
+        self.assertGreater(
+            counters[('yatube_db_queries_total', labels)], 0
+        )
+        self.assertGreater(
+            counters[('yatube_template_seconds_total', labels)], 0
+        )
+
+    def test_cache_page_hits_and_misses(self):
+        """Страницы делятся на попадания в кэш и промахи."""
+        for _ in range(3):
+            self.client.get(reverse('posts:index'))
+        metrics = self.get_metrics()
+        self.assertIn(
+            'yatube_cache_page_total{view="posts:index",result="miss"} 1',
+            metrics
+        )
+        self.assertIn(
+            'yatube_cache_page_total{view="posts:index",result="hit"} 2',
+            metrics
+        )
+
+    @override_settings(METRICS_SAMPLE_RATE=0.0)
+    def test_unsampled_requests_skip_detailed_timings(self):
+        """Вне выборки считается только время ответа."""
+        self.client.get(reverse('posts:index'))
+        counters, histograms = registry.collect()
+        labels = (('view', 'posts:index'),)
+        self.assertIn(('yatube_request_duration_seconds', labels), histograms)
+        self.assertNotIn(('yatube_db_queries_total', labels), counters)
+
+    @override_settings(METRICS_ALLOWED_IPS=[])
+    def test_metrics_hidden_from_other_addresses(self):
+        """/metrics доступен только адресам METRICS_ALLOWED_IPS."""
+        response = self.client.get(reverse('core:metrics'))
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+
+    def test_shards_of_all_threads_collected(self):
+        """Метрики из разных потоков складываются при выдаче."""
+        labels = (('view', 'test'),)
+        workers = [
+            threading.Thread(
+                target=registry.inc, args=('yatube_requests_total', labels)
+            )
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        counters, _ = registry.collect()
+        self.assertEqual(counters[('yatube_requests_total', labels)], 4)
+
+    def test_finished_thread_shards_merged(self):
+        """Шарды завершившихся потоков не копятся, их метрики
+        сохраняются.
+        """
+        labels = (('view', 'test'),)
+        for _ in range(20):
+            worker = threading.Thread(
+                target=registry.observe,
+                args=('yatube_request_duration_seconds', labels, 0.2)
+            )
+            worker.start()
+            worker.join()
+        self.assertLessEqual(len(registry._shards), 2)
+        _, histograms = registry.collect()
+        self.assertTrue(
+            all(thread.is_alive() for thread in registry._shards)
+        )
+        values = histograms[('yatube_request_duration_seconds', labels)]
+        self.assertEqual(sum(values[:-1]), 20)
+
+
+class ThrottleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.other = User.objects.create_user(username='other')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        registry.clear()
+        cache.clear()
+        self.client.force_login(self.user)
+        self.url = reverse('posts:add_comment', args=(self.post.pk,))
+
+    def comment(self, client=None):
+        return (client or self.client).post(self.url, {'text': 'Спам'})
+
+    def test_bucket_refills_over_period(self):
+        """Корзина отдаёт capacity токенов и наполняется за период."""
+        state = None
+        for _ in range(2):
+            state, wait = consume(state, 2, 60, now=0)
+            self.assertEqual(wait, 0)
+        state, wait = consume(state, 2, 60, now=0)
+        self.assertEqual(wait, 30)
+        _, wait = consume(state, 2, 60, now=30)
+        self.assertEqual(wait, 0)
+
+    @override_settings(THROTTLE_RATES={'add_comment': {'user': '2/m'}})
+    def test_user_limit_returns_429(self):
+        """Сверх частоты пользователь получает 429 с Retry-After,
+        а отказ считается в метриках.
+        """
+        for _ in range(2):
+            self.assertEqual(self.comment().status_code, HTTPStatus.FOUND)
+        response = self.comment()
+        self.assertEqual(response.status_code, HTTPStatus.TOO_MANY_REQUESTS)
+        self.assertTemplateUsed(response, 'core/429.html')
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(self.post.comments.count(), 2)
+        counters, _ = registry.collect()
+        self.assertEqual(counters[('yatube_throttled_total', (
+            ('scope', 'add_comment'), ('key', 'user')
+        ))], 1)
+
+    @override_settings(
+        THROTTLE_RATES={'add_comment': {'user': None, 'ip': '1/m'}}
+    )
+    def test_ip_limit_shared_by_users(self):
+        """Корзина IP общая для всех пользователей с этого адреса."""
+        other_client = Client()
+        other_client.force_login(self.other)
+        self.assertEqual(self.comment().status_code, HTTPStatus.FOUND)
+        self.assertEqual(
+            self.comment(other_client).status_code,
+            HTTPStatus.TOO_MANY_REQUESTS
+        )
+
+    @override_settings(THROTTLE_RATES={'add_comment': {'user': '1/m'}})
+    def test_local_buckets_when_cache_fails(self):
+        """Без кэша частота ограничивается корзинами процесса."""
+        with patch.object(
+            cache_buckets, 'take', side_effect=ConnectionError
+        ), patch.object(local_buckets, '_buckets', OrderedDict()):
+            self.assertEqual(self.comment().status_code, HTTPStatus.FOUND)
+            self.assertEqual(
+                self.comment().status_code, HTTPStatus.TOO_MANY_REQUESTS
+            )
+
+    @override_settings(
+        THROTTLE_ENABLED=False,
+        THROTTLE_RATES={'add_comment': {'user': '1/m'}}
+    )
+    def test_throttling_can_be_disabled(self):
+        """THROTTLE_ENABLED=False отключает ограничение."""
+        for _ in range(3):
+            self.assertEqual(self.comment().status_code, HTTPStatus.FOUND)
+
+
+class DatabaseConfigTests(TestCase):
+    def test_sqlite_url(self):
+        """Путь SQLite берётся относительно BASE_DIR, есть busy_timeout."""
+        config = database_config('sqlite:///db.sqlite3', '/srv/yatube')
+        self.assertEqual(config['NAME'], '/srv/yatube/db.sqlite3')
+        self.assertEqual(config['OPTIONS'], {'timeout': SQLITE_TIMEOUT})
+        self.assertEqual(config['CONN_MAX_AGE'], CONN_MAX_AGE)
+        absolute = database_config(
+            'sqlite:////tmp/yatube.db?test_name=bench.sqlite3', '/srv'
+        )
+        self.assertEqual(absolute['NAME'], '/tmp/yatube.db')
+        self.assertEqual(absolute['TEST'], {'NAME': '/srv/bench.sqlite3'})
+
+    def test_replica_urls(self):
+        """Реплики нумеруются по порядку и в тестах смотрят в default."""
+        replicas = replica_configs(
+            'sqlite:///one.sqlite3, sqlite:///two.sqlite3', '/srv'
+        )
+        self.assertEqual(list(replicas), ['replica_1', 'replica_2'])
+        self.assertEqual(replicas['replica_2']['NAME'], '/srv/two.sqlite3')
+        self.assertEqual(replicas['replica_1']['TEST'], {'MIRROR': 'default'})
+        self.assertEqual(replica_configs('', '/srv'), {})
+
+    def test_postgres_url(self):
+        """URL PostgreSQL раскладывается по настройкам, pgbouncer
+        отключает серверные курсоры.
+        """
+        config = database_config(
+            'postgres://yatube:p%40ss@db:6432/yatube'
+            '?pool=pgbouncer&conn_max_age=300&sslmode=require',
+            '/srv'
+        )
+        self.assertEqual(config['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(
+            (config['USER'], config['PASSWORD'], config['HOST']),
+            ('yatube', 'p@ss', 'db')
+        )
+        self.assertEqual((config['PORT'], config['NAME']), ('6432', 'yatube'))
+        self.assertEqual(config['CONN_MAX_AGE'], 300)
+        self.assertTrue(config['DISABLE_SERVER_SIDE_CURSORS'])
+        self.assertEqual(config['OPTIONS'], {'sslmode': 'require'})
+
+    def test_pool_off_and_errors(self):
+        """pool=off открывает соединение на запрос, ошибки в URL
+        останавливают запуск.
+        """
+        config = database_config('postgres://db/yatube?pool=off', '/srv')
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+        for url in ('mysql://db/yatube', 'sqlite:///db?pool=magic'):
+            with self.subTest(url=url):
+                with self.assertRaises(ImproperlyConfigured):
+                    database_config(url, '/srv')
+
+    def test_sqlite_connections_use_wal(self):
+        """Новые соединения SQLite переводятся в режим WAL."""
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = ConnectionHandler({'default': database_config(
+                'sqlite:///yatube.sqlite3', directory
+            )})['default']
+            try:
+                with wrapper.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode')
+                    self.assertEqual(cursor.fetchone()[0], 'wal')
+                    cursor.execute('PRAGMA busy_timeout')
+                    self.assertEqual(
+                        cursor.fetchone()[0], SQLITE_TIMEOUT * 1000
+                    )
+            finally:
+                wrapper.close()
+
+
+class HealthTests(TestCase):
+    def test_healthy(self):
+        """Проверка отвечает 200, когда база и кэш доступны."""
+        response = self.client.get(reverse('core:health'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.json()['checks'], {
+            'database:default': 'ok', 'cache': 'ok',
+        })
+
+    def test_database_down(self):
+        """Недоступная база даёт 503."""
+        with patch.object(
+            connection, 'cursor', side_effect=OperationalError('down')
+        ):
+            response = self.client.get(reverse('core:health'))
+        self.assertEqual(
+            response.status_code, HTTPStatus.SERVICE_UNAVAILABLE
+        )
+        self.assertEqual(
+            response.json()['checks']['database:default'], 'down'
+        )
+
+
+def read_database(request):
+    return Post.objects.all().db
+
+
+def count_posts(request):
+    return Post.objects.count()
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1', 'replica_2'])
+class ReplicaRoutingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='writer')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        selector.clear()
+        self.lags = {'replica_1': 0.0, 'replica_2': 0.0}
+        patcher = patch(
+            'core.replicas.measure_lag', side_effect=self.lags.get
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def read(self, view=read_database, cookies=None):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        request.COOKIES.update(cookies or {})
+        return replica_reads(view)(request)
+
+    def test_round_robin(self):
+        """Чтения по очереди идут в разные реплики, запись — в default."""
+        first, second, third = (self.read() for _ in range(3))
+        self.assertEqual({first, second}, {'replica_1', 'replica_2'})
+        self.assertEqual(first, third)
+        self.assertEqual(Post.objects.all().db, 'default')
+        self.assertEqual(ReplicaRouter().db_for_write(Post), 'default')
+
+    @override_settings(REPLICA_SELECTION='least_lag')
+    def test_least_lag(self):
+        """least_lag выбирает реплику с наименьшим отставанием."""
+        self.lags.update(replica_1=3.0, replica_2=1.0)
+        self.assertEqual(self.read(), 'replica_2')
+
+    def test_lagging_and_unavailable_replicas_skipped(self):
+        """Отстающие и недоступные реплики пропускаются, без реплик
+        чтение идёт в default.
+        """
+        self.lags.update(replica_1=None, replica_2=0.0)
+        self.assertEqual(
+            {self.read() for _ in range(2)}, {'replica_2'}
+        )
+        selector.clear()
+        self.lags.update(replica_2=REPLICA_MAX_LAG + 1)
+        self.assertEqual(self.read(), 'default')
+
+    def test_pinned_client_reads_primary(self):
+        """После записи клиент читает из default, пока не истёк срок."""
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('posts:add_comment', args=(self.post.pk,)),
+            {'text': 'Комментарий'}
+        )
+        pin = response.cookies[PIN_COOKIE]
+        self.assertEqual(pin['max-age'], REPLICA_PIN_SECONDS)
+        self.assertEqual(
+            self.read(cookies={PIN_COOKIE: pin.value}), 'default'
+        )
+        expired = str(time.time() - 1)
+        self.assertNotEqual(
+            self.read(cookies={PIN_COOKIE: expired}), 'default'
+        )
+
+    def test_follow_pins_primary(self):
+        """Подписка GET-запросом тоже закрепляет клиента за default."""
+        other = User.objects.create_user(username='reader')
+        self.client.force_login(other)
+        response = self.client.get(
+            reverse('posts:profile_follow', args=(self.user.username,))
+        )
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas(self):
+        """Без реплик всё читается из default и клиент не закрепляется."""
+        self.assertEqual(self.read(), 'default')
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('posts:add_comment', args=(self.post.pk,)),
+            {'text': 'Комментарий'}
+        )
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_cache_fills_read_primary(self):
+        """Страница для общего кэша и кэшируемое число постов
+        читаются из default.
+        """
+        view = cache_feed(FEED_VERSION)(replica_reads(
+            lambda request: HttpResponse(read_database(request))
+        ))
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        self.assertEqual(view(request).content, b'default')
+        self.assertNotEqual(self.read(), 'default')
+        with patch.object(
+            QuerySet, 'count', autospec=True, return_value=1
+        ) as count:
+            replica_reads(lambda request: feed_count(
+                Post.objects.all(), (FEED_VERSION,)
+            ))(request)
+        queryset = count.call_args[0][0]
+        self.assertEqual(queryset.db, 'default')
+
+    def test_feed_views_read_from_replicas(self):
+        """Ленты и страница поста выбирают реплику, создание поста — нет."""
+        self.client.force_login(self.user)
+        with patch(
+            'core.replicas.choose_replica', return_value=None
+        ) as choose:
+            self.client.get(reverse('posts:index'))
+            self.client.get(
+                reverse('posts:post_detail', args=(self.post.pk,))
+            )
+            self.client.get(reverse('posts:follow_index'))
+            self.assertEqual(choose.call_count, 3)
+            self.client.get(reverse('posts:post_create'))
+            self.assertEqual(choose.call_count, 3)
+
+
+class SQLiteReplicaTests(TestCase):
+    """Реплики — отдельные файлы SQLite, куда default не пишет."""
+
+    aliases = ('replica_1', 'replica_2')
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        for alias in cls.aliases:
+            connections.databases[alias] = database_config(
+                f'sqlite:///{alias}.sqlite3', cls.directory.name
+            )
+            connections.ensure_defaults(alias)
+            connections.prepare_test_settings(alias)
+            with connections[alias].schema_editor() as editor:
+                editor.create_model(Post)
+                editor.create_model(UserStats)
+
+    @classmethod
+    def tearDownClass(cls):
+        for alias in cls.aliases:
+            connections[alias].close()
+            del connections[alias]
+            del connections.databases[alias]
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    def test_read_your_writes(self):
+        """Новый пост не виден в репликах, но виден написавшему."""
+        user = User.objects.create_user(username='writer')
+        Post.objects.create(author=user, text='Пост')
+        selector.clear()
+        with override_settings(DATABASE_REPLICAS=list(self.aliases)):
+            request = RequestFactory().get('/')
+            request.user = user
+            self.assertEqual(replica_reads(count_posts)(request), 0)
+            request.COOKIES[PIN_COOKIE] = str(time.time() + 60)
+            self.assertEqual(replica_reads(count_posts)(request), 1)
+
+    def test_missing_stats_created_on_primary(self):
+        """Недостающие счётчики создаются и возвращаются из default,
+        даже если чтения идут в реплику без этой записи.
+        """
+        user = User.objects.create_user(username='writer')
+        Post.objects.create(author=user, text='Пост')
+        UserStats.objects.filter(user=user).delete()
+        selector.clear()
+        with override_settings(DATABASE_REPLICAS=list(self.aliases)):
+            request = RequestFactory().get('/')
+            request.user = user
+            stats = replica_reads(lambda request: get_stats(user))(request)
+        self.assertEqual(stats.posts_count, 1)
+        self.assertTrue(UserStats.objects.filter(user=user).exists())
+
+
+class CacheConfigTests(TestCase):
+    def test_shared_backends(self):
+        """URL раскладывается в общий бэкенд за TieredCache."""
+        config = cache_config(
+            'sqlite:///cache.sqlite3?timeout=60&local_size=100', '/srv',
+            shared_only=('throttle:',)
+        )
+        self.assertEqual(config['BACKEND'], 'core.caches.TieredCache')
+        options = config['OPTIONS']
+        self.assertEqual(options['LOCAL_SIZE'], 100)
+        self.assertEqual(options['SHARED_ONLY'], ('throttle:',))
+        self.assertEqual(options['SHARED'], {
+            'BACKEND': 'core.caches.SQLiteCache',
+            'LOCATION': '/srv/cache.sqlite3',
+            'KEY_PREFIX': '',
+            'TIMEOUT': 60,
+            'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+        })
+        redis = cache_config('redis://cache:6379/1?local_size=10', '/srv')
+        self.assertEqual(
+            redis['OPTIONS']['SHARED']['LOCATION'], 'redis://cache:6379/1'
+        )
+        memcached = cache_config('memcached://cache:11211', '/srv')
+        self.assertEqual(
+            memcached['OPTIONS']['SHARED']['LOCATION'], 'cache:11211'
+        )
+        with self.assertRaises(ImproperlyConfigured):
+            cache_config('couchbase://cache', '/srv')
+
+
+class SQLiteCacheTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = f'{directory.name}/cache.sqlite3'
+        self.cache = self.open()
+
+    def open(self, **options):
+        return SQLiteCache(self.path, {'OPTIONS': options})
+
+    def test_shared_between_instances(self):
+        """Экземпляры с одним файлом, как разные процессы, видят
+        записи друг друга.
+        """
+        other = self.open()
+        self.cache.set_many({'a': [1], 'b': {'x': 2}})
+        self.assertEqual(other.get_many(['a', 'b', 'c']), {
+            'a': [1], 'b': {'x': 2},
+        })
+        other.delete('a')
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_expiry_add_and_incr(self):
+        """Истёкшие ключи не читаются, add и incr атомарны."""
+        self.cache.set('old', 1, timeout=0)
+        self.assertFalse(self.cache.has_key('old'))
+        self.assertTrue(self.cache.add('old', 2))
+        self.assertFalse(self.cache.add('old', 3))
+        self.assertEqual(self.cache.incr('old', 5), 7)
+        self.assertEqual(self.open().get('old'), 7)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_cull(self):
+        """Сверх MAX_ENTRIES удаляются ключи, истекающие раньше."""
+        cache = self.open(MAX_ENTRIES=10, CULL_FREQUENCY=2)
+        cache.set_many({f'soon-{n}': n for n in range(10)}, timeout=60)
+        cache.set_many({f'late-{n}': n for n in range(10)}, timeout=None)
+        cache.cull()
+        self.assertEqual(
+            len(cache.get_many([f'soon-{n}' for n in range(10)])), 0
+        )
+        self.assertEqual(
+            len(cache.get_many([f'late-{n}' for n in range(10)])), 10
+        )
+
+
+class TieredCacheTests(TestCase):
+    now = 0
+
+    def setUp(self):
+        registry.clear()
+        self.shared = {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': f'tiered-{self._testMethodName}',
+        }
+        # Разные LOCATION — LRU разных процессов над одним общим кэшем.
+        self.cache = self.open(f'process-a-{self._testMethodName}')
+        self.other = self.open(f'process-b-{self._testMethodName}')
+
+    def open(self, location):
+        cache = TieredCache(location, {'OPTIONS': {
+            'SHARED': self.shared, 'LOCAL_SIZE': 2, 'LOCAL_TIMEOUT': 5,
+            'SHARED_ONLY': ('version:',),
+        }})
+        cache.clock = lambda: self.now
+        return cache
+
+    def counters(self, tier):
+        counters, _ = registry.collect()
+        return {
+            result: counters.get(('yatube_cache_requests_total', (
+                ('tier', tier), ('result', result)
+            )), 0)
+            for result in ('hit', 'miss')
+        }
+
+    def test_hits_counted_per_tier(self):
+        """Повторное чтение отдаётся из памяти процесса."""
+        self.cache.set('page', 'html')
+        self.assertEqual(self.other.get('page'), 'html')
+        self.assertEqual(self.other.get('page'), 'html')
+        self.assertIsNone(self.other.get('missing'))
+        self.assertEqual(self.counters('local'), {'hit': 1, 'miss': 2})
+        self.assertEqual(self.counters('shared'), {'hit': 1, 'miss': 1})
+
+    def test_other_process_writes_visible_after_timeout(self):
+        """Чужая запись видна после LOCAL_TIMEOUT, своя — сразу, ключи
+        SHARED_ONLY — всегда.
+        """
+        self.cache.set_many({'page': 'old', 'version:feed': 1})
+        self.other.get_many(['page', 'version:feed'])
+        self.cache.set('page', 'new')
+        self.cache.incr('version:feed')
+        self.assertEqual(self.cache.get('page'), 'new')
+        self.assertEqual(self.other.get('page'), 'old')
+        self.assertEqual(self.other.get('version:feed'), 2)
+        self.now += 5
+        self.assertEqual(self.other.get('page'), 'new')
+
+    def test_local_copies_are_independent(self):
+        """Изменение прочитанного значения не портит кэш, а LRU держит
+        не больше LOCAL_SIZE ключей.
+        """
+        self.cache.set('list', [1])
+        self.cache.get('list').append(2)
+        self.assertEqual(self.cache.get('list'), [1])
+        self.cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(list(self.cache._local), [
+            self.cache.shared.make_key('a'), self.cache.shared.make_key('b')
+        ])
+
+    def test_threads_share_local_tier(self):
+        """Бэкенд, созданный в другом потоке, читает тот же LRU."""
+        self.cache.set('page', 'html')
+        found = {}
+
+        def read():
+            cache = self.open(f'process-a-{self._testMethodName}')
+            found['page'] = cache.get('page')
+
+        thread = threading.Thread(target=read)
+        thread.start()
+        thread.join()
+        self.assertEqual(found['page'], 'html')
+        self.assertEqual(self.counters('local'), {'hit': 1, 'miss': 0})
+        self.assertEqual(self.counters('shared'), {'hit': 0, 'miss': 0})
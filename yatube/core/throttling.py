@@ -0,0 +1,138 @@
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.shortcuts import render
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+THROTTLE_KEY: str = 'throttle:{scope}:{kind}:{ident}'
+LOCAL_BUCKETS_LIMIT: int = 10000
+
+
+def parse_rate(rate):
+    """'10/m' -> (10, 60): число запросов и период в секундах."""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+def consume(state, capacity, period, now):
+    """Берёт токен из корзины в состоянии (tokens, updated).
+
+    Корзина вмещает capacity токенов и полностью наполняется за
+    period секунд. Возвращает новое состояние и сколько секунд ждать
+    токена; 0 — запрос разрешён.
+    """
+    tokens, updated = state or (capacity, now)
+    tokens = min(capacity, tokens + (now - updated) * capacity / period)
+    if tokens >= 1:
+        return (tokens - 1, now), 0
+    return (tokens, now), (1 - tokens) * period / capacity
+
+
+class LocalBuckets:
+    """Корзины в памяти процесса на случай недоступного кэша."""
+
+    def __init__(self, limit=LOCAL_BUCKETS_LIMIT):
+        self.limit = limit
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, period, now):
+        with self._lock:
+            state, wait = consume(
+                self._buckets.pop(key, None), capacity, period, now
+            )
+            self._buckets[key] = state
+            if len(self._buckets) > self.limit:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class CacheBuckets:
+    """Корзины в кэше Django, общие для всех процессов.
+
+    get и set не атомарны: параллельные запросы с одним ключом
+    могут изредка пропустить лишний токен, для защиты от скриптов
+    этого достаточно.
+    """
+
+    def take(self, key, capacity, period, now):
+        state, wait = consume(cache.get(key), capacity, period, now)
+        cache.set(key, state, math.ceil(period))
+        return wait
+
+
+cache_buckets = CacheBuckets()
+local_buckets = LocalBuckets()
+
+
+def take_token(key, capacity, period):
+    now = time.time()
+    try:
+        return cache_buckets.take(key, capacity, period, now)
+    except Exception:
+        logger.warning('Throttle cache unavailable, using local buckets')
+        return local_buckets.take(key, capacity, period, now)
+
+
+def get_rates(scope, rates):
+    """Частоты view с учётом settings.THROTTLE_RATES[scope]."""
+    return {
+        **rates, **getattr(settings, 'THROTTLE_RATES', {}).get(scope, {})
+    }
+
+
+def get_idents(request):
+    idents = {'ip': request.META.get('REMOTE_ADDR', '')}
+    if request.user.is_authenticated:
+        idents['user'] = request.user.pk
+    return idents
+
+
+def throttled(request, wait):
+    response = render(request, 'core/429.html', status=429)
+    response['Retry-After'] = str(math.ceil(wait))
+    return response
+
+
+def throttle(scope, methods=('POST',), **rates):
+    """Ограничивает запросы к view корзинами токенов.
+
+    rates задают частоту по видам ключа, например user='5/m',
+    ip='30/m'; settings.THROTTLE_RATES[scope] их переопределяет,
+    а None отключает ключ. При превышении отвечает 429 с Retry-After.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in methods
+                    or not getattr(settings, 'THROTTLE_ENABLED', True)):
+                return view(request, *args, **kwargs)
+            idents = get_idents(request)
+            waits = {}
+            for kind, rate in get_rates(scope, rates).items():
+                if rate is None or kind not in idents:
+                    continue
+                key = THROTTLE_KEY.format(
+                    scope=scope, kind=kind, ident=idents[kind]
+                )
+                waits[kind] = take_token(key, *parse_rate(rate))
+            limited = [kind for kind, wait in waits.items() if wait]
+            if not limited:
+                return view(request, *args, **kwargs)
+            for kind in limited:
+                registry.inc('yatube_throttled_total', (
+                    ('scope', scope), ('key', kind)
+                ))
+            return throttled(request, max(waits.values()))
+        return wrapper
+    return decorator
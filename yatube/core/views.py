@@ -1,5 +1,11 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render
 
+from .metrics import render_metrics
+
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
@@ -17,3 +23,35 @@ def server_error(request):
 
 def permission_denied(request, exception):
     return render(request, 'core/403.html', status=403)
+
+
+def metrics(request):
+    """Метрики процесса для Prometheus, только с METRICS_ALLOWED_IPS."""
+    allowed = getattr(settings, 'METRICS_ALLOWED_IPS', settings.INTERNAL_IPS)
+    if request.META.get('REMOTE_ADDR') not in allowed:
+        return permission_denied(request, None)
+    return HttpResponse(
+        render_metrics(), content_type='text/plain; version=0.0.4'
+    )
+
+
+def health(request):
+    """Проверка для балансировщика: базы данных и кэш отвечают."""
+    checks = {}
+    for alias in connections:
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT 1')
+            checks[f'database:{alias}'] = 'ok'
+        except DatabaseError as error:
+            checks[f'database:{alias}'] = str(error)
+    try:
+        cache.set('health', 'ok', 10)
+        checks['cache'] = cache.get('health') or 'miss'
+    except Exception as error:
+        checks['cache'] = str(error)
+    healthy = all(result == 'ok' for result in checks.values())
+    return JsonResponse(
+        {'status': 'ok' if healthy else 'error', 'checks': checks},
+        status=200 if healthy else 503
+    )
@@ -0,0 +1,189 @@
+import itertools
+import json
+import math
+import random
+import subprocess
+import time
+from dataclasses import dataclass, field
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from mixer.backend.django import mixer
+
+from .models import Comment, Follow, Group, Post, User
+
+SCENARIOS = (
+    'index', 'group_list', 'profile', 'post_detail', 'follow_index',
+    'post_create',
+)
+VOLUMES = {
+    'users': 50,
+    'groups': 5,
+    'posts': 1000,
+    'comments': 2000,
+    'follows': 300,
+}
+# Кэш бенчмарка: отдельный locmem с тем же LRU, что у сайта, чтобы
+# --cold-cache не очищал общий кэш работающих процессов.
+BENCHMARK_CACHE_URL: str = 'locmem://benchmark?local_size=1000'
+
+
+@dataclass
+class Dataset:
+    users: list
+    groups: list
+    posts: list
+    volumes: dict = field(default_factory=dict)
+
+
+def seed(volumes=None, seed=0):
+    """Заполняет базу через mixer с фиксированным зерном Faker."""
+    volumes = {**VOLUMES, **(volumes or {})}
+    rng = random.Random(seed)
+    mixer.faker.seed_instance(seed)
+    users = mixer.cycle(volumes['users']).blend(
+        User, username=mixer.sequence('bench_user_{0}')
+    )
+    groups = mixer.cycle(volumes['groups']).blend(
+        Group, slug=mixer.sequence('bench-group-{0}')
+    )
+    posts = mixer.cycle(volumes['posts']).blend(
+        Post,
+        author=(rng.choice(users) for _ in range(volumes['posts'])),
+        group=(rng.choice(groups) for _ in range(volumes['posts'])),
+        image=''
+    )
+    mixer.cycle(volumes['comments']).blend(
+        Comment,
+        post=(rng.choice(posts) for _ in range(volumes['comments'])),
+        author=(rng.choice(users) for _ in range(volumes['comments']))
+    )
+    pairs = [
+        (user, author)
+        for user, author in itertools.permutations(users, 2)
+    ]
+    for user, author in rng.sample(
+        pairs, min(volumes['follows'], len(pairs))
+    ):
+        Follow.objects.create(user=user, author=author)
+    return Dataset(users, groups, posts, volumes)
+
+
+def percentile(timings, share):
+    ordered = sorted(timings)
+    return ordered[max(math.ceil(share * len(ordered)) - 1, 0)]
+
+
+class Benchmark:
+    """Замеряет view постов тестовым клиентом Django.
+
+    Каждый сценарий — метод, который выполняет один запрос;
+    адреса выбираются из набора данных с фиксированным зерном.
+    """
+
+    def __init__(self, dataset, seed=0, cold_cache=False):
+        self.dataset = dataset
+        self.rng = random.Random(seed)
+        self.cold_cache = cold_cache
+        self.guest = Client()
+        self.reader = Client()
+        self.reader.force_login(
+            max(dataset.users, key=lambda user: user.follower.count())
+        )
+
+    def index(self):
+        return self.guest.get(reverse('posts:index'))
+
+    def group_list(self):
+        group = self.rng.choice(self.dataset.groups)
+        return self.guest.get(reverse('posts:group_list', args=(group.slug,)))
+
+    def profile(self):
+        user = self.rng.choice(self.dataset.users)
+        return self.guest.get(reverse('posts:profile', args=(user.username,)))
+
+    def post_detail(self):
+        post = self.rng.choice(self.dataset.posts)
+        return self.guest.get(reverse('posts:post_detail', args=(post.pk,)))
+
+    def follow_index(self):
+        return self.reader.get(reverse('posts:follow_index'))
+
+    def post_create(self):
+        return self.reader.post(
+            reverse('posts:post_create'), data={'text': 'Пост из бенчмарка'}
+        )
+
+    def measure(self, scenario, iterations, warmup=0):
+        request = getattr(self, scenario)
+        for _ in range(warmup):
+            request()
+        timings = []
+        for _ in range(iterations):
+            if self.cold_cache:
+                cache.clear()
+            started = time.perf_counter()
+            response = request()
+            timings.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                raise RuntimeError(
+                    f'{scenario}: ответ {response.status_code}'
+                )
+        total = sum(timings)
+        return {
+            'requests': iterations,
+            'throughput_rps': round(iterations / total, 2),
+            'mean_ms': round(total / iterations * 1000, 3),
+            'p50_ms': round(percentile(timings, 0.5) * 1000, 3),
+            'p99_ms': round(percentile(timings, 0.99) * 1000, 3),
+        }
+
+    def run(self, scenarios=SCENARIOS, iterations=50, warmup=5):
+        return {
+            scenario: self.measure(scenario, iterations, warmup)
+            for scenario in scenarios
+        }
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', '--short', 'HEAD'),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(dataset, results, **options):
+    """Результаты с параметрами запуска для сравнения между коммитами."""
+    return {
+        'commit': current_commit(),
+        'database': connection.vendor,
+        'volumes': dataset.volumes,
+        'options': options,
+        'results': results,
+    }
+
+
+def compare(previous, current):
+    """Строки с изменением p50 и p99 относительно прошлого отчёта."""
+    lines = []
+    for scenario, result in current['results'].items():
+        before = previous['results'].get(scenario)
+        if before is None:
+            continue
+        changes = ', '.join(
+            f'{metric} {before[metric]} -> {result[metric]} '
+            f'({(result[metric] - before[metric]) / before[metric]:+.0%})'
+            for metric in ('p50_ms', 'p99_ms')
+        )
+        lines.append(f'{scenario}: {changes}')
+    return lines
+
+
+def load_report(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
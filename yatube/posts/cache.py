@@ -0,0 +1,291 @@
+import hashlib
+import math
+import random
+import time
+from datetime import datetime, timezone
+from functools import wraps
+from http import HTTPStatus
+
+from core.holes import fill_holes
+from core.replicas import is_pinned, read_primary
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .models import Group, User
+
+FEED_CACHE_SECONDS: int = 6 * 60 * 60
+# Сколько устаревшая страница хранится, чтобы отдавать её, пока
+# другой запрос рендерит новую.
+PAGE_STALE_SECONDS: int = 10 * 60
+# Блокировка пересчёта снимается сама, если рендерящий процесс упал.
+PAGE_LOCK_SECONDS: int = 30
+PAGE_WAIT_SECONDS: float = 3.0
+PAGE_WAIT_STEP: float = 0.05
+# Больше — раньше начинается пересчёт до истечения срока.
+EARLY_EXPIRY_BETA: float = 1.0
+PAGE_KEY: str = 'posts:page:{url}'
+PAGE_LOCK_KEY: str = 'posts:page-lock:{key}'
+# Гостевые страницы браузер и CDN держат столько секунд без проверки,
+# страницы пользователей проверяются по ETag каждый раз.
+ANONYMOUS_MAX_AGE: int = 30
+
+FEED_VERSION: str = 'feed'
+GROUP_VERSION: str = 'group:{slug}'
+AUTHOR_VERSION: str = 'author:{username}'
+POST_VERSION: str = 'post:{post_id}'
+
+
+def version_key(scope):
+    return f'posts:version:{scope}'
+
+
+def _now_version():
+    # Версия — время изменения в миллисекундах: она не совпадёт с
+    # версиями старых страниц, даже если счётчик был вытеснен из кэша,
+    # и служит временем Last-Modified.
+    return int(time.time() * 1000)
+
+
+def get_versions(*scopes):
+    """Возвращает текущие версии областей одним обращением к кэшу."""
+    keys = [version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = {
+        key: _now_version() for key in keys if key not in versions
+    }
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(*scopes):
+    """Делает устаревшими все страницы, закэшированные под областями.
+
+    Версия сдвигается атомарным incr до текущего времени, а если
+    оно уже пройдено — на единицу.
+    """
+    now = _now_version()
+    keys = [version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        try:
+            cache.incr(key, max(1, now - versions.get(key, now)))
+        except ValueError:
+            cache.set(key, now, None)
+
+
+def bump_post_feeds(post, previous_group_id=None):
+    """Делает устаревшими ленты, в которых показывается пост."""
+    slugs = Group.objects.filter(
+        pk__in={post.group_id, previous_group_id} - {None}
+    ).values_list('slug', flat=True)
+    usernames = User.objects.filter(
+        pk=post.author_id
+    ).values_list('username', flat=True)
+    bump_versions(
+        FEED_VERSION,
+        POST_VERSION.format(post_id=post.pk),
+        *(AUTHOR_VERSION.format(username=name) for name in usernames),
+        *(GROUP_VERSION.format(slug=slug) for slug in slugs)
+    )
+
+
+def page_key(request):
+    # Страница одна для всех: части, зависящие от пользователя,
+    # выводятся тегом hole и подставляются core.holes.fill_holes.
+    url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return PAGE_KEY.format(url=url)
+
+
+def page_versions(request, scopes, kwargs):
+    """Версии областей страницы, одни на весь запрос.
+
+    Область — шаблон с именованными аргументами view или функция
+    (request, **kwargs), возвращающая имя области.
+    """
+    names = tuple(
+        scope(request, **kwargs) if callable(scope) else scope.format(**kwargs)
+        for scope in scopes
+    )
+    known = request.__dict__.setdefault('_page_versions', {})
+    if names not in known:
+        known[names] = get_versions(*names)
+    return known[names]
+
+
+def viewer_version(request, **kwargs):
+    """Версия автора-зрителя меняется с его подписками."""
+    return AUTHOR_VERSION.format(username=request.user.get_username())
+
+
+def page_etag(request, versions):
+    # Токен CSRF входит в ETag: после его смены формы в сохранённой
+    # браузером странице перестали бы отправляться.
+    viewer = (
+        request.user.pk if request.user.is_authenticated else 'anonymous'
+    )
+    token = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    return hashlib.md5(
+        f'{request.get_full_path()}:{viewer}:{token}:{versions}'.encode()
+    ).hexdigest()
+
+
+def page_last_modified(versions):
+    if not versions:
+        return None
+    # Одновременные изменения могут увести версию вперёд часов.
+    now = _now_version()
+    modified = min(max(versions), now) // 1000
+    # Заголовок точен до секунды: изменение в той же секунде дало бы
+    # тот же Last-Modified и ложный 304 по If-Modified-Since. Пока
+    # секунда не прошла, страница проверяется только по ETag.
+    if modified == now // 1000:
+        return None
+    return datetime.fromtimestamp(modified, timezone.utc)
+
+
+def set_cache_policy(request, response):
+    if getattr(request, 'page_cache_result', None) == 'stale':
+        # Устаревшая страница не должна закрепиться у клиента под
+        # валидаторами новой версии.
+        del response['ETag']
+        del response['Last-Modified']
+        patch_cache_control(response, no_cache=True)
+    elif request.user.is_authenticated or response.cookies:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(
+            response, public=True, max_age=ANONYMOUS_MAX_AGE
+        )
+
+
+def conditional_page(*scopes):
+    """ETag и Last-Modified страницы по версиям scopes.
+
+    Если версии не менялись с прошлого ответа клиенту, он получает
+    304 до запросов к базе и рендеринга шаблонов. Области задаются
+    как в cache_feed или функциями (request, **kwargs).
+    """
+    def decorator(view):
+        def etag(request, *args, **kwargs):
+            return page_etag(
+                request, page_versions(request, scopes, kwargs)
+            )
+
+        def last_modified(request, *args, **kwargs):
+            return page_last_modified(
+                page_versions(request, scopes, kwargs)
+            )
+
+        conditional_view = condition(etag, last_modified)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD'):
+                set_cache_policy(request, response)
+            return response
+        return wrapper
+    return decorator
+
+
+def is_fresh(entry, versions, now):
+    """Страница рендерилась при текущих версиях и не истекла.
+
+    Срок истекает раньше на случайную величину тем большую, чем
+    дольше страница рендерилась (XFetch): пересчёт начинает один
+    запрос, а не все, пришедшие в момент истечения.
+    """
+    if entry['versions'] != versions:
+        return False
+    early = -entry['duration'] * EARLY_EXPIRY_BETA * math.log(
+        1 - random.random()
+    )
+    return now + early < entry['expires']
+
+
+def wait_for_page(key):
+    """Ждёт страницу, которую рендерит другой запрос."""
+    deadline = time.monotonic() + PAGE_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(PAGE_WAIT_STEP)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def render_page(view, request, args, kwargs, key, versions, timeout):
+    started = time.perf_counter()
+    request.punch_holes = True
+    read_primary(request)
+    response = view(request, *args, **kwargs)
+    if not getattr(response, 'is_rendered', True):
+        response.render()
+    duration = time.perf_counter() - started
+    if (response.status_code == HTTPStatus.OK and not response.streaming
+            and not response.cookies):
+        cache.set(key, {
+            'response': response,
+            'versions': versions,
+            'expires': time.time() + timeout,
+            'duration': duration,
+        }, timeout + PAGE_STALE_SECONDS)
+    return response
+
+
+def get_page(view, request, args, kwargs, scopes, timeout):
+    versions = page_versions(request, scopes, kwargs)
+    key = page_key(request)
+    entry = cache.get(key)
+    if entry is not None and is_fresh(entry, versions, time.time()):
+        request.page_cache_result = 'hit'
+        return entry['response']
+    lock = PAGE_LOCK_KEY.format(key=key)
+    if not cache.add(lock, True, PAGE_LOCK_SECONDS):
+        # Недавно писавший клиент должен увидеть свою запись, а не
+        # прежнюю версию страницы.
+        if is_pinned(request, time.time()):
+            entry = None
+        else:
+            entry = entry or wait_for_page(key)
+        if entry is not None:
+            request.page_cache_result = 'stale'
+            return entry['response']
+        # Рендерящий запрос не уложился в ожидание.
+        lock = None
+    request.page_cache_result = 'miss'
+    try:
+        return render_page(
+            view, request, args, kwargs, key, versions, timeout
+        )
+    finally:
+        if lock:
+            cache.delete(lock)
+
+
+def cache_feed(*scopes, timeout=FEED_CACHE_SECONDS):
+    """Кэширует страницу на timeout секунд до смены версий scopes.
+
+    Области задаются шаблонами с именованными аргументами view,
+    например GROUP_VERSION для group_list(request, slug).
+    Страница хранится одна для всех пользователей, их фрагменты
+    подставляются в каждый ответ. Устаревшую страницу пересчитывает
+    один запрос, остальные тем временем получают прежнюю версию,
+    а если её нет — ждут. Клиенты, закреплённые за основной базой
+    после записи, прежнюю версию не получают. Страница для кэша
+    рендерится из основной базы, а не из реплики.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            return fill_holes(request, get_page(
+                view, request, args, kwargs, scopes, timeout
+            ))
+        return wrapper
+    return decorator
@@ -0,0 +1,86 @@
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+
+from .cache import FEED_CACHE_SECONDS, get_versions
+
+COUNT_KEY: str = 'posts:count:{versions}:{query}'
+# Выше этого числа строк точный COUNT(*) заменяется оценкой СУБД.
+COUNT_ESTIMATE_THRESHOLD: int = 100000
+
+
+def _postgresql_estimate(connection, queryset):
+    # Оценка планировщика годится для любого фильтра; точка сохранения
+    # не даёт ошибке EXPLAIN прервать транзакцию запроса.
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with transaction.atomic(using=connection.alias):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def _sqlite_estimate(connection, queryset):
+    # sqlite_stat1 заполняет ANALYZE; первое число stat — строки
+    # таблицы, поэтому оценка есть только для выборки без фильтра.
+    if queryset.query.where:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+            [queryset.model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    return int(row[0].split()[0]) if row else None
+
+
+ESTIMATORS = {
+    'postgresql': _postgresql_estimate,
+    'sqlite': _sqlite_estimate,
+}
+
+
+def estimate_count(queryset):
+    """Оценка числа строк по статистике СУБД без их подсчёта,
+    None — оценки нет.
+    """
+    connection = connections[queryset.db]
+    estimator = ESTIMATORS.get(connection.vendor)
+    if estimator is None:
+        return None
+    try:
+        return estimator(connection, queryset)
+    except DatabaseError:
+        return None
+
+
+def feed_count(queryset, scopes=(), exact=False):
+    """Число строк ленты и признак, что это оценка.
+
+    Результат кэшируется под версиями scopes и пересчитывается после
+    записей, которые их меняют; такое число всегда берётся из основной
+    базы. Без scopes считается каждый раз. exact=True заменяет
+    закэшированную оценку точным числом.
+    """
+    key = None
+    if scopes:
+        # Число с отстающей реплики сохранилось бы под новыми версиями.
+        queryset = queryset.using(DEFAULT_DB_ALIAS)
+        query = hashlib.md5(str(queryset.query).encode()).hexdigest()
+        versions = '.'.join(map(str, get_versions(*scopes)))
+        key = COUNT_KEY.format(versions=versions, query=query)
+        counted = None if exact else cache.get(key)
+        if counted is not None:
+            return counted
+    estimate = None if exact else estimate_count(queryset)
+    if estimate is not None and estimate >= COUNT_ESTIMATE_THRESHOLD:
+        counted = (estimate, True)
+    else:
+        counted = (queryset.count(), False)
+    if key:
+        cache.set(key, counted, FEED_CACHE_SECONDS)
+    return counted
@@ -1,6 +1,8 @@
+from django.core.files.uploadedfile import UploadedFile
 from django.forms.models import ModelForm
 
 from .models import Comment, Post
+from .uploads import check_image, reencode_image
 
 
 class PostForm(ModelForm):
@@ -8,6 +10,14 @@ class PostForm(ModelForm):
         model = Post
         fields = ('text', 'group', 'image',)
 
+    def clean_image(self):
+        """Проверяет новую картинку и сохраняет её пережатой без EXIF."""
+        image = self.cleaned_data['image']
+        if not isinstance(image, UploadedFile):
+            return image
+        check_image(image)
+        return reencode_image(image)
+
 
 class CommentForm(ModelForm):
     class Meta:
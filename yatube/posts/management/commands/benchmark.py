@@ -0,0 +1,92 @@
+import json
+
+from core.caches import cache_config
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test.utils import (override_settings, setup_databases,
+                               teardown_databases)
+
+from ...benchmark import (BENCHMARK_CACHE_URL, SCENARIOS, VOLUMES, Benchmark,
+                          compare, load_report, report, seed)
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет тестовую базу и замеряет пропускную способность '
+        'и задержки страниц постов; результат выводится в JSON'
+    )
+
+    def add_arguments(self, parser):
+        for name, default in VOLUMES.items():
+            parser.add_argument(
+                f'--{name}',
+                type=int,
+                default=default,
+                help=f'Сколько создать: {name}'
+            )
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            choices=SCENARIOS,
+            help='Сценарий для замера, по умолчанию все'
+        )
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--cold-cache',
+            action='store_true',
+            help='Очищать кэш перед каждым запросом'
+        )
+        parser.add_argument('--output', help='Файл для JSON с результатами')
+        parser.add_argument(
+            '--compare',
+            help='JSON прошлого запуска для сравнения p50 и p99'
+        )
+
+    def handle(self, *args, **options):
+        # Данные создаются в отдельной тестовой базе, DEBUG выключен,
+        # чтобы не копить connection.queries, а ограничение частоты —
+        # чтобы post_create не упирался в 429. Кэш свой, в памяти:
+        # clear() общего кэша стёр бы страницы работающего сайта.
+        caches = {'default': cache_config(
+            BENCHMARK_CACHE_URL, settings.BASE_DIR,
+            shared_only=settings.CACHES['default']['OPTIONS']['SHARED_ONLY']
+        )}
+        with override_settings(
+            DEBUG=False, THROTTLE_ENABLED=False, CACHES=caches
+        ):
+            old_config = setup_databases(verbosity=0, interactive=False)
+            try:
+                cache.clear()
+                dataset = seed(
+                    {name: options[name] for name in VOLUMES},
+                    seed=options['seed']
+                )
+                benchmark = Benchmark(
+                    dataset, options['seed'], options['cold_cache']
+                )
+                results = benchmark.run(
+                    options['scenario'] or SCENARIOS,
+                    options['iterations'],
+                    options['warmup']
+                )
+            finally:
+                teardown_databases(old_config, verbosity=0)
+        data = report(
+            dataset, results,
+            iterations=options['iterations'],
+            warmup=options['warmup'],
+            seed=options['seed'],
+            cold_cache=options['cold_cache']
+        )
+        text = json.dumps(data, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(text)
+        else:
+            self.stdout.write(text)
+        if options['compare']:
+            for line in compare(load_report(options['compare']), data):
+                self.stdout.write(line)
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from ...media import collect_garbage
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает ссылки на картинки постов и удаляет файлы, '
+        'которые не нужны ни одному посту'
+    )
+
+    def handle(self, *args, **options):
+        removed = collect_garbage()
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено файлов: {removed}'
+        ))
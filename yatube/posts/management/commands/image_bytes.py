@@ -0,0 +1,81 @@
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+
+from ...models import Post
+from ...thumbnails import (FALLBACK_FORMAT, FALLBACK_WIDTH, VARIANT_WIDTHS,
+                           backend, get_formats, variant_geometry)
+from ...views import LIST_VOLUME
+
+# Ширины экранов (CSS-пиксели) и плотность пикселей типичных клиентов.
+CLIENTS = (
+    ('телефон', 360, 3),
+    ('планшет', 768, 2),
+    ('ноутбук', 1366, 1),
+    ('монитор', 1920, 2),
+)
+# Слот картинки, как в thumbnails.IMAGE_SIZES.
+WIDE_SCREEN: int = 992
+
+
+def pick_width(viewport, dpr):
+    """Ширина варианта, которую браузер выберет из srcset."""
+    slot = FALLBACK_WIDTH if viewport >= WIDE_SCREEN else viewport
+    needed = slot * dpr
+    for width in VARIANT_WIDTHS:
+        if width >= needed:
+            return width
+    return VARIANT_WIDTHS[-1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает объём картинок первой страницы ленты до и после '
+        'перехода на srcset'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts',
+            type=int,
+            default=LIST_VOLUME,
+            help='Сколько постов с картинками взять из ленты'
+        )
+
+    def variant_size(self, image, width, format_):
+        geometry, options = variant_geometry(width, format_)
+        thumbnail = backend.get_thumbnail(image, geometry, **options)
+        return default.storage.size(thumbnail.name)
+
+    def page_bytes(self, images, width, format_):
+        return sum(
+            self.variant_size(image, width, format_) for image in images
+        )
+
+    def handle(self, *args, **options):
+        images = [
+            post.image for post in
+            Post.objects.exclude(image='').order_by('-pub_date', '-pk')[
+                :options['posts']
+            ]
+        ]
+        if not images:
+            self.stdout.write('В ленте нет постов с картинками')
+            return
+        legacy = self.page_bytes(images, FALLBACK_WIDTH, FALLBACK_FORMAT)
+        formats = get_formats()
+        self.stdout.write(
+            f'Постов с картинками: {len(images)}, '
+            f'до: {legacy} байт на страницу '
+            f'({FALLBACK_WIDTH}px {FALLBACK_FORMAT} для всех)'
+        )
+        for name, viewport, dpr in CLIENTS:
+            width = pick_width(viewport, dpr)
+            results = []
+            for format_ in formats:
+                size = self.page_bytes(images, width, format_)
+                results.append(
+                    f'{format_} {size} байт ({size / legacy:.0%})'
+                )
+            self.stdout.write(
+                f'{name} {viewport}px x{dpr}: {width}w, ' + ', '.join(results)
+            )
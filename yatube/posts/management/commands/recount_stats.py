@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from ...stats import RECOUNT_BATCH_SIZE, recount_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики пользователей и исправляет расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=RECOUNT_BATCH_SIZE,
+            help='Сколько пользователей сверять за один проход'
+        )
+
+    def handle(self, *args, **options):
+        fixed = recount_stats(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено записей счётчиков: {fixed}'
+        ))
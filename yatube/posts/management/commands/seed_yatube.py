@@ -0,0 +1,76 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from ...seeding import BATCH_SIZE, SEED_PASSWORD, VOLUMES, seed_yatube
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу правдоподобными данными в объёмах продакшена: '
+        'подписки по степенному закону, посты всплесками, ветки '
+        f'комментариев. Пароль пользователей: {SEED_PASSWORD}'
+    )
+
+    def add_arguments(self, parser):
+        for name, default in VOLUMES.items():
+            parser.add_argument(
+                f'--{name}',
+                type=int,
+                default=default,
+                help=f'Сколько создать: {name}'
+            )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Число процессов, генерирующих строки'
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--images',
+            type=float,
+            default=0.0,
+            help='Доля постов с картинкой, от 0 до 1'
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=365,
+            help='За сколько дней до --until публикуются посты'
+        )
+        parser.add_argument(
+            '--until',
+            help='Дата последнего поста YYYY-MM-DD, по умолчанию сегодня'
+        )
+
+    def handle(self, *args, **options):
+        until = None
+        if options['until']:
+            try:
+                until = timezone.make_aware(
+                    datetime.strptime(options['until'], '%Y-%m-%d')
+                )
+            except ValueError:
+                raise CommandError('--until: ожидается дата YYYY-MM-DD')
+        try:
+            created = seed_yatube(
+                {name: options[name] for name in VOLUMES},
+                seed=options['seed'],
+                workers=options['workers'],
+                batch_size=options['batch_size'],
+                image_share=options['images'],
+                until=until,
+                days=options['days'],
+                progress=self.report if options['verbosity'] > 1 else None
+            )
+        except ValueError as error:
+            raise CommandError(error)
+        self.stdout.write(self.style.SUCCESS(', '.join(
+            f'{name}: {count}' for name, count in created.items()
+        )))
+
+    def report(self, kind, count):
+        self.stdout.write(f'{kind}: {count}')
@@ -0,0 +1,136 @@
+import logging
+import posixpath
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from .models import MediaFile, Post
+
+logger = logging.getLogger(__name__)
+
+# Файл, записанный недавно, может принадлежать ещё не сохранённому посту.
+SWEEP_GRACE = timedelta(hours=1)
+# Столько после записи или повторной загрузки файл не удаляется вместе
+# с последней ссылкой: загрузка того же содержимого могла найти его
+# на диске до удаления. Такой файл позже уберёт collect_garbage.
+UPLOAD_GRACE = timedelta(minutes=10)
+SWEEP_BATCH_SIZE: int = 500
+
+
+def get_storage():
+    return Post._meta.get_field('image').storage
+
+
+def add_reference(name):
+    """Атомарно добавляет ссылку на файл."""
+    if MediaFile.objects.filter(name=name).update(refs=F('refs') + 1):
+        return
+    _, created = MediaFile.objects.get_or_create(
+        name=name, defaults={'refs': 1}
+    )
+    if not created:
+        MediaFile.objects.filter(name=name).update(refs=F('refs') + 1)
+
+
+def release_reference(name):
+    """Убирает ссылку; файл без ссылок удаляется после коммита."""
+    MediaFile.objects.filter(name=name, refs__gt=0).update(
+        refs=F('refs') - 1
+    )
+    transaction.on_commit(lambda: collect_file(name))
+
+
+def delete_file(name):
+    """Удаляет файл вместе с миниатюрами и записями sorl."""
+    image_file = ImageFile(name, get_storage())
+    default.kvstore.delete(image_file)
+    image_file.delete()
+
+
+def is_recently_saved(storage, name):
+    try:
+        modified = storage.get_modified_time(name)
+    except FileNotFoundError:
+        return False
+    return modified > timezone.now() - UPLOAD_GRACE
+
+
+def collect_file(name):
+    deleted, _ = MediaFile.objects.filter(name=name, refs=0).delete()
+    if not deleted:
+        return
+    # Запрос уже закоммичен, ошибка удаления не должна его ронять.
+    try:
+        if is_recently_saved(get_storage(), name):
+            return
+        delete_file(name)
+    except Exception:
+        logger.exception('Deleting %s failed', name)
+
+
+def recount_references():
+    """Пересчитывает ссылки по таблице постов."""
+    counted = Post.objects.filter(
+        image=OuterRef('name')
+    ).order_by().values('image').annotate(total=Count('pk')).values('total')
+    MediaFile.objects.update(refs=Coalesce(Subquery(counted), 0))
+    missing = Post.objects.exclude(image='').exclude(
+        image__in=MediaFile.objects.values('name')
+    ).order_by().values('image').annotate(refs=Count('pk'))
+    MediaFile.objects.bulk_create(
+        (MediaFile(name=row['image'], refs=row['refs']) for row in missing),
+        batch_size=SWEEP_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def _walk(storage, path):
+    directories, files = storage.listdir(path)
+    for filename in files:
+        yield posixpath.join(path, filename)
+    for directory in directories:
+        yield from _walk(storage, posixpath.join(path, directory))
+
+
+def _sweep(storage, names):
+    known = set(MediaFile.objects.filter(
+        name__in=names
+    ).values_list('name', flat=True))
+    threshold = timezone.now() - SWEEP_GRACE
+    removed = 0
+    for name in names:
+        if name in known or storage.get_modified_time(name) > threshold:
+            continue
+        delete_file(name)
+        removed += 1
+    return removed
+
+
+def collect_garbage():
+    """Сверяет ссылки и удаляет файлы картинок, которые не нужны постам.
+
+    Возвращает число удалённых файлов.
+    """
+    recount_references()
+    orphans = list(
+        MediaFile.objects.filter(refs=0).values_list('name', flat=True)
+    )
+    for name in orphans:
+        collect_file(name)
+    removed = len(orphans)
+    storage = get_storage()
+    upload_to = Post._meta.get_field('image').upload_to.rstrip('/')
+    if storage.exists(upload_to):
+        batch = []
+        for name in _walk(storage, upload_to):
+            batch.append(name)
+            if len(batch) == SWEEP_BATCH_SIZE:
+                removed += _sweep(storage, batch)
+                batch = []
+        removed += _sweep(storage, batch)
+    return removed
@@ -0,0 +1,24 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:02
+
+from django.db import migrations
+
+
+def install_search_index(apps, schema_editor):
+    from posts.search import get_backend
+    get_backend().install()
+
+
+def uninstall_search_index(apps, schema_editor):
+    from posts.search import get_backend
+    get_backend().uninstall()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
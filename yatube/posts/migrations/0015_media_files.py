@@ -0,0 +1,45 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:06
+
+from django.db import migrations, models
+import posts.storage
+
+
+def fill_media_files(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    MediaFile = apps.get_model('posts', 'MediaFile')
+    MediaFile.objects.bulk_create(
+        (
+            MediaFile(name=row['image'], refs=row['refs'])
+            for row in Post.objects.exclude(image='').order_by().values(
+                'image'
+            ).annotate(refs=models.Count('pk'))
+        ),
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('name', models.CharField(help_text='Путь файла в хранилище картинок постов', max_length=255, primary_key=True, serialize=False, verbose_name='Имя файла')),
+                ('refs', models.PositiveIntegerField(default=0, help_text='Число постов с этой картинкой', verbose_name='Ссылок')),
+            ],
+            options={
+                'verbose_name': 'Файл картинки',
+                'verbose_name_plural': 'Файлы картинок',
+            },
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, help_text='Загрузите картинку', storage=posts.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='картинка поста'),
+        ),
+        migrations.RunPython(fill_media_files, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,40 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models.functions import Coalesce
+from django.utils.http import int_to_base36
+
+from .storage import ContentAddressedStorage
 
 User = get_user_model()
 
+# Путь комментария — pk предков и его собственный в base36
+# по PATH_SEGMENT символов; сортировка по пути даёт порядок дерева.
+PATH_SEGMENT: int = 7
+# Символ больше любой цифры base36: поддерево — path от p до p + PATH_END.
+PATH_END: str = '~'
+MAX_COMMENT_DEPTH: int = 30
+
+
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для карточек ленты: автор и группа одним JOIN,
+        только нужные карточке поля и число комментариев.
+
+        Число комментариев считается подзапросом по индексу комментариев
+        поста: JOIN с GROUP BY заставил бы базу перебрать и отсортировать
+        всю ленту, а не взять страницу по индексу (-pub_date, -id).
+        """
+        comments = Comment.objects.filter(
+            post=models.OuterRef('pk')
+        ).order_by().values('post').annotate(
+            total=models.Count('pk')
+        ).values('total')
+        return self.select_related('author', 'group').only(
+            'text', 'pub_date', 'edited', 'image',
+            'author__username', 'author__first_name', 'author__last_name',
+            'group__title', 'group__slug',
+        ).annotate(comment_count=Coalesce(models.Subquery(comments), 0))
+
 
 class Group(models.Model):
     title = models.CharField(
@@ -34,6 +66,11 @@ class Post(models.Model):
         verbose_name='Дата публикации',
         help_text='Дата заполняется автоматически'
     )
+    edited = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+        help_text='Дата заполняется автоматически'
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -52,15 +89,32 @@ class Post(models.Model):
     )
     image = models.ImageField(
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True,
         verbose_name='картинка поста',
         help_text='Загрузите картинку'
     )
 
+    objects = PostQuerySet.as_manager()
+
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_pub_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -90,6 +144,58 @@ class Comment(models.Model):
         verbose_name='Дата комментария',
         help_text='Дата заполняется автоматически'
     )
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        related_name='replies',
+        blank=True,
+        null=True,
+        verbose_name='Ответ на комментарий',
+        help_text='Комментарий, на который отвечают'
+    )
+    path = models.CharField(
+        max_length=PATH_SEGMENT * (MAX_COMMENT_DEPTH + 1),
+        blank=True,
+        editable=False,
+        verbose_name='Путь в ветке',
+        help_text='Заполняется автоматически после сохранения'
+    )
+    replies_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число ответов',
+        help_text='Все ответы в поддереве комментария'
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=('post', 'parent', 'created', 'id'),
+                name='comment_thread_cursor_idx'
+            ),
+            models.Index(fields=('path',), name='comment_path_idx'),
+        ]
+
+    @staticmethod
+    def make_path(parent_path, pk):
+        return parent_path + int_to_base36(pk).rjust(PATH_SEGMENT, '0')
+
+    @property
+    def depth(self):
+        return max(len(self.path) // PATH_SEGMENT - 1, 0)
+
+    def save(self, *args, **kwargs):
+        # Ответ на слишком глубокий комментарий становится его соседом.
+        if self.parent is not None and (
+            self.parent.depth >= MAX_COMMENT_DEPTH
+        ):
+            self.parent = self.parent.parent
+        super().save(*args, **kwargs)
+        if not self.path:
+            self.path = self.make_path(
+                self.parent.path if self.parent else '', self.pk
+            )
+            Comment.objects.filter(pk=self.pk).update(path=self.path)
 
 
 class Follow(models.Model):
@@ -107,3 +213,108 @@ class Follow(models.Model):
         verbose_name='Автор подписки',
         help_text='Пользователь, на которого подписываются'
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='unique_follow'
+            ),
+            models.CheckConstraint(
+                check=~models.Q(user=models.F('author')),
+                name='no_self_follow'
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель ленты',
+        help_text='Пользователь, в ленту которого попадает пост'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост ленты',
+        help_text='Пост автора, на которого подписан читатель'
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации',
+        help_text='Копия даты публикации поста для сортировки ленты'
+    )
+
+    class Meta:
+        ordering = ('-pub_date',)
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи ленты подписок'
+        indexes = [
+            models.Index(
+                fields=('user', '-pub_date', '-post'),
+                name='timeline_user_cursor_idx'
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique_timeline_entry'
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+        help_text='Пользователь, для которого ведутся счётчики'
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Постов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписчиков'
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписок'
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Комментариев'
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self):
+        return f'Счётчики {self.user_id}'
+
+
+class MediaFile(models.Model):
+    name = models.CharField(
+        max_length=255,
+        primary_key=True,
+        verbose_name='Имя файла',
+        help_text='Путь файла в хранилище картинок постов'
+    )
+    refs = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Ссылок',
+        help_text='Число постов с этой картинкой'
+    )
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+
+    def __str__(self):
+        return self.name
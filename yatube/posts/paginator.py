@@ -0,0 +1,225 @@
+from functools import partial
+from math import ceil
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes
+from django.utils.functional import SimpleLazyObject, cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from .counts import feed_count
+
+NEXT: str = 'n'
+PREVIOUS: str = 'p'
+# Сколько номеров страниц показывать вокруг текущей и у краёв.
+ON_EACH_SIDE: int = 2
+ON_ENDS: int = 1
+
+
+class InvalidCursorError(Exception):
+    pass
+
+
+def encode_cursor(number, direction, pk, key):
+    """Упаковывает позицию (key, pk) в непрозрачный токен."""
+    raw = f'{number}:{direction}:{pk}:{key}'
+    return urlsafe_base64_encode(force_bytes(raw))
+
+
+def decode_cursor(cursor):
+    """Возвращает (number, direction, pk, key) из токена."""
+    try:
+        raw = urlsafe_base64_decode(cursor).decode()
+        number, direction, pk, key = raw.split(':', 3)
+        number, pk = int(number), int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise InvalidCursorError(cursor)
+    if number < 1 or direction not in (NEXT, PREVIOUS):
+        raise InvalidCursorError(cursor)
+    return number, direction, pk, key
+
+
+def page_window(number, last, on_each_side=ON_EACH_SIDE, on_ends=ON_ENDS):
+    """Номера страниц вокруг number и у краёв, None — пропуск.
+
+    last=None — число страниц известно лишь примерно, последние
+    страницы не показываются.
+    """
+    right = number + on_each_side
+    if last is not None:
+        right = min(right, last)
+    numbers = set(range(1, min(on_ends, number) + 1))
+    numbers.update(range(max(1, number - on_each_side), right + 1))
+    if last is not None:
+        numbers.update(range(max(right + 1, last - on_ends + 1), last + 1))
+    window = []
+    for page in sorted(numbers):
+        if window and page - window[-1] > 1:
+            window.append(None)
+        window.append(page)
+    if last is None:
+        window.append(None)
+    return window
+
+
+class KeysetPaginator(Paginator):
+    """Паджинатор по ключу (pub_date, pk), по умолчанию от новых
+    к старым.
+
+    Первая страница и переходы по ?cursor= выбираются через
+    WHERE (pub_date, pk) < (...) LIMIT n + 1 без COUNT(*) и OFFSET.
+    Ссылки ?page=N из окна номеров обслуживаются обычным Paginator.
+    Число строк для окна считается лениво по count_list (по умолчанию
+    object_list) и кэшируется под версиями count_scopes; известное
+    заранее число передаётся в count.
+    """
+    key_field = 'pub_date'
+
+    def __init__(self, object_list, per_page, ascending=False, count=None,
+                 count_list=None, count_scopes=(), **kwargs):
+        self.ascending = ascending
+        self.known_count = count
+        self.count_list = count_list
+        self.count_scopes = count_scopes
+        # Без источника числа строк окно номеров не строится.
+        self.numbered = count is not None or count_list is not None
+        self.count_is_estimated = False
+        order = '' if ascending else '-'
+        object_list = object_list.order_by(
+            f'{order}{self.key_field}', f'{order}pk'
+        )
+        super().__init__(object_list, per_page, **kwargs)
+
+    @cached_property
+    def count(self):
+        if self.known_count is not None:
+            return self.known_count
+        return self.feed_count()
+
+    def feed_count(self, exact=False):
+        count_list = self.count_list
+        if count_list is None:
+            count_list = self.object_list
+        count, self.count_is_estimated = feed_count(
+            count_list, self.count_scopes, exact=exact
+        )
+        return count
+
+    def page(self, number):
+        page = super().page(number)
+        page.object_list = list(page.object_list)
+        if page.object_list or not self.count_is_estimated:
+            return page
+        # Оценка оказалась больше настоящего числа строк: считаем
+        # точно и отдаём последнюю страницу.
+        self.count = self.feed_count(exact=True)
+        self.__dict__.pop('num_pages', None)
+        return super().page(min(number, self.num_pages))
+
+    def window(self, page):
+        """Номера страниц для навигации; пусто, если лента не
+        считается.
+        """
+        if not self.numbered:
+            return []
+        last = None
+        count = self.count
+        if not self.count_is_estimated:
+            last = max(
+                ceil(count / self.per_page), page.number + page.has_next()
+            )
+        return page_window(page.number, last)
+
+    def dump_key(self, row):
+        return getattr(row, self.key_field).isoformat()
+
+    def load_key(self, key):
+        value = parse_datetime(key)
+        if value is None:
+            raise InvalidCursorError(key)
+        return value
+
+    def fetch(self, direction, position, limit):
+        """Возвращает limit строк после позиции (key, pk) в порядке
+        обхода: для NEXT — в порядке страниц, для PREVIOUS — в
+        обратном.
+        """
+        return list(self.seek(self.object_list, direction, position)[:limit])
+
+    def seek(self, queryset, direction, position, pk_field='pk'):
+        """Строки queryset после позиции (key, pk) в порядке обхода;
+        pk_field — поле с pk строки ленты.
+        """
+        ascending = (direction == NEXT) == self.ascending
+        order = '' if ascending else '-'
+        queryset = queryset.order_by(
+            f'{order}{self.key_field}', f'{order}{pk_field}'
+        )
+        if position is None:
+            return queryset
+        key, pk = position
+        lookup = 'gt' if ascending else 'lt'
+        return queryset.filter(
+            Q(**{f'{self.key_field}__{lookup}': key})
+            | Q(**{self.key_field: key, f'{pk_field}__{lookup}': pk})
+        )
+
+    def get_page(self, number=None, cursor=None):
+        if cursor:
+            try:
+                return self.cursor_page(cursor)
+            except InvalidCursorError:
+                pass
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            number = 1
+        if number == 1:
+            return self._keyset_page(1, NEXT)
+        return self._attach_cursors(super().get_page(number))
+
+    def cursor_page(self, cursor):
+        number, direction, pk, key = decode_cursor(cursor)
+        position = (self.load_key(key), pk)
+        page = self._keyset_page(number, direction, position)
+        if not page.object_list:
+            return self._keyset_page(1, NEXT)
+        return page
+
+    def _keyset_page(self, number, direction, position=None):
+        rows = self.fetch(direction, position, self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == PREVIOUS:
+            rows.reverse()
+            has_next = True
+            if not has_more:
+                number = 1
+        else:
+            has_next = has_more
+        # Число страниц заранее неизвестно: для Page.has_next()
+        # достаточно знать, есть ли хотя бы одна следующая.
+        self.num_pages = number + 1 if has_next else number
+        return self._attach_cursors(Page(rows, number, self))
+
+    def _attach_cursors(self, page):
+        page.object_list = list(page.object_list)
+        page.next_cursor = page.previous_cursor = None
+        # Число строк считается, только если шаблон выводит окно.
+        page.window = SimpleLazyObject(partial(self.window, page))
+        if page.object_list and page.has_next():
+            last = page.object_list[-1]
+            page.next_cursor = encode_cursor(
+                page.number + 1, NEXT, last.pk, self.dump_key(last)
+            )
+        if page.object_list and page.has_previous():
+            first = page.object_list[0]
+            page.previous_cursor = encode_cursor(
+                page.number - 1, PREVIOUS, first.pk, self.dump_key(first)
+            )
+        return page
+
+
+class CommentPaginator(KeysetPaginator):
+    key_field = 'created'
@@ -0,0 +1,283 @@
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import FloatField, Value
+from django.utils.html import escape
+from django.utils.module_loading import import_string
+
+from .models import Post
+from .paginator import NEXT, InvalidCursorError, KeysetPaginator
+
+FTS_TABLE: str = 'posts_post_fts'
+SNIPPET_WORDS: int = 24
+# Управляющие символы не встречаются в тексте постов и после
+# экранирования HTML заменяются на теги подсветки.
+MARK_START: str = '\x02'
+MARK_END: str = '\x03'
+CONTROL_CHARS = re.compile('[\x00-\x1f\x7f-\x9f]')
+
+
+def clean_query(query):
+    """Запрос без управляющих символов: NUL обрывает строку запроса
+    FTS5, а MARK_START и MARK_END подсветка превратила бы в теги.
+    """
+    return ' '.join(CONTROL_CHARS.sub(' ', query).split())
+
+
+def highlight(snippet):
+    return escape(snippet).replace(
+        MARK_START, '<mark>'
+    ).replace(MARK_END, '</mark>')
+
+
+class SearchBackend:
+    """Полнотекстовый поиск по постам.
+
+    ranked_sql() возвращает SQL с колонками (id, rank), где меньший
+    rank означает более релевантный пост; постраничный вывод по
+    (rank, id) строится поверх него одинаково для всех бэкендов.
+    """
+
+    @classmethod
+    def is_available(cls):
+        return True
+
+    def install(self):
+        """Создаёт индекс и заполняет его существующими постами."""
+
+    def uninstall(self):
+        pass
+
+    def index_post(self, post):
+        pass
+
+    def remove_post(self, post_id):
+        pass
+
+    def ranked_sql(self, query):
+        raise NotImplementedError
+
+    def snippets(self, query, ids):
+        raise NotImplementedError
+
+    def ranked_ids(self, query, direction, position, limit):
+        inner, params = self.ranked_sql(query)
+        sql = f'SELECT id, rank FROM ({inner}) hits'
+        params = list(params)
+        order = 'ASC' if direction == NEXT else 'DESC'
+        if position is not None:
+            rank, pk = position
+            compare = '>' if direction == NEXT else '<'
+            sql += (
+                f' WHERE rank {compare} %s'
+                f' OR (rank = %s AND id {compare} %s)'
+            )
+            params += [rank, rank, pk]
+        sql += f' ORDER BY rank {order}, id {order} LIMIT %s'
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+
+class SimpleSearchBackend(SearchBackend):
+    """Поиск подстрокой без индекса для прочих СУБД."""
+
+    def ranked_sql(self, query):
+        return Post.objects.filter(text__icontains=query).annotate(
+            rank=Value(0.0, output_field=FloatField())
+        ).order_by().values('id', 'rank').query.sql_with_params()
+
+    def snippets(self, query, ids):
+        pattern = re.compile(re.escape(query), re.IGNORECASE)
+        result = {}
+        for pk, text in Post.objects.filter(
+            pk__in=ids
+        ).values_list('pk', 'text'):
+            match = pattern.search(text)
+            start = max(match.start() - 80, 0) if match else 0
+            fragment = text[start:start + 240]
+            result[pk] = highlight(pattern.sub(
+                lambda found: f'{MARK_START}{found.group()}{MARK_END}',
+                fragment
+            ))
+        return result
+
+
+class SqliteSearchBackend(SearchBackend):
+    """Виртуальная таблица FTS5 с копией текста постов."""
+
+    @classmethod
+    def is_available(cls):
+        if connection.vendor != 'sqlite':
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA compile_options')
+            options = {row[0] for row in cursor.fetchall()}
+        return 'ENABLE_FTS5' in options
+
+    def install(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} '
+                f'USING fts5(text, tokenize="unicode61")'
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE}(rowid, text) '
+                f'SELECT id, text FROM {Post._meta.db_table}'
+            )
+
+    def uninstall(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+    def index_post(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post.pk]
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE}(rowid, text) VALUES (%s, %s)',
+                [post.pk, post.text]
+            )
+
+    def remove_post(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id]
+            )
+
+    @staticmethod
+    def match_expression(query):
+        # Каждое слово берётся в кавычки, чтобы ввод пользователя
+        # не разбирался как синтаксис запросов FTS5.
+        return ' '.join(
+            '"{}"'.format(word.replace('"', '""')) for word in query.split()
+        )
+
+    def ranked_sql(self, query):
+        return (
+            f'SELECT rowid AS id, bm25({FTS_TABLE}) AS rank '
+            f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            [self.match_expression(query)]
+        )
+
+    def snippets(self, query, ids):
+        if not ids:
+            return {}
+        placeholders = ', '.join(['%s'] * len(ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, snippet({FTS_TABLE}, 0, %s, %s, %s, %s) '
+                f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'AND rowid IN ({placeholders})',
+                [MARK_START, MARK_END, '…', SNIPPET_WORDS,
+                 self.match_expression(query), *ids]
+            )
+            return {pk: highlight(text) for pk, text in cursor.fetchall()}
+
+
+class PostgresSearchBackend(SearchBackend):
+    """tsvector по тексту поста с GIN-индексом по выражению.
+
+    Индекс по выражению обновляется самой СУБД, поэтому
+    index_post() и remove_post() ничего не делают.
+    """
+    config = 'russian'
+    index_name = 'posts_post_text_tsv_idx'
+
+    @classmethod
+    def is_available(cls):
+        return connection.vendor == 'postgresql'
+
+    def install(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {self.index_name} '
+                f'ON {Post._meta.db_table} '
+                f"USING GIN (to_tsvector('{self.config}', text))"
+            )
+
+    def uninstall(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP INDEX IF EXISTS {self.index_name}')
+
+    def ranked_sql(self, query):
+        return (
+            f"SELECT id, -ts_rank(to_tsvector('{self.config}', text), "
+            f"plainto_tsquery('{self.config}', %s)) AS rank "
+            f'FROM {Post._meta.db_table} '
+            f"WHERE to_tsvector('{self.config}', text) "
+            f"@@ plainto_tsquery('{self.config}', %s)",
+            [query, query]
+        )
+
+    def snippets(self, query, ids):
+        if not ids:
+            return {}
+        options = (
+            f'StartSel={MARK_START}, StopSel={MARK_END}, '
+            f'MaxWords={SNIPPET_WORDS}, MinWords={SNIPPET_WORDS // 2}'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT id, ts_headline('{self.config}', text, "
+                f"plainto_tsquery('{self.config}', %s), %s) "
+                f'FROM {Post._meta.db_table} WHERE id = ANY(%s)',
+                [query, options, list(ids)]
+            )
+            return {pk: highlight(text) for pk, text in cursor.fetchall()}
+
+
+BACKENDS = (PostgresSearchBackend, SqliteSearchBackend, SimpleSearchBackend)
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    """Бэкенд из settings.POSTS_SEARCH_BACKEND или первый доступный."""
+    path = getattr(settings, 'POSTS_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    for backend in BACKENDS:
+        if backend.is_available():
+            return backend()
+    return SimpleSearchBackend()
+
+
+class SearchPaginator(KeysetPaginator):
+    """Постраничный вывод результатов поиска по ключу (rank, pk)."""
+    key_field = 'rank'
+
+    def __init__(self, query, per_page, backend=None, **kwargs):
+        self.query = query
+        self.backend = backend or get_backend()
+        super().__init__(Post.objects.none(), per_page, **kwargs)
+
+    def dump_key(self, row):
+        return repr(row.rank)
+
+    def load_key(self, key):
+        try:
+            return float(key)
+        except ValueError:
+            raise InvalidCursorError(key)
+
+    def fetch(self, direction, position, limit):
+        hits = self.backend.ranked_ids(self.query, direction, position, limit)
+        posts = Post.objects.for_feed().in_bulk([pk for pk, _ in hits])
+        snippets = self.backend.snippets(self.query, list(posts))
+        rows = []
+        for pk, rank in hits:
+            post = posts.get(pk)
+            if post is None:
+                continue
+            post.rank = rank
+            post.snippet = snippets.get(pk, '')
+            rows.append(post)
+        return rows
+
+    def get_page(self, number=None, cursor=None):
+        # Переход по номеру страницы потребовал бы OFFSET по рангу.
+        return super().get_page(1, cursor=cursor)
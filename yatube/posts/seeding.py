@@ -0,0 +1,466 @@
+import itertools
+import math
+import multiprocessing
+import random
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta
+from functools import lru_cache
+from io import BytesIO
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+from PIL import Image, ImageDraw
+
+from . import media, search
+from .cache import FEED_VERSION, bump_versions
+from .models import (MAX_COMMENT_DEPTH, PATH_SEGMENT, Comment, Follow, Group,
+                     Post, User)
+from .stats import recount_stats
+from .threads import lineage
+from .timeline import fill_timelines
+
+VOLUMES = {
+    'users': 10_000,
+    'groups': 50,
+    'posts': 200_000,
+    'comments': 500_000,
+    'follows': 200_000,
+}
+BATCH_SIZE: int = 5000
+SEED_PASSWORD: str = 'yatube-seed'
+# Популярность авторов, групп и постов убывает как 1 / rank ** ZIPF_EXPONENT.
+ZIPF_EXPONENT: float = 1.1
+# Хвост распределения числа комментариев к посту и подписок читателя.
+PARETO_ALPHA: float = 1.5
+GROUP_SHARE: float = 0.7
+# Посты публикуются всплесками: в среднем POSTS_PER_BURST постов
+# со средним интервалом BURST_GAP от начала всплеска.
+POSTS_PER_BURST: int = 20
+BURST_GAP = timedelta(minutes=40)
+COMMENT_DELAY = timedelta(hours=3)
+# Доля комментариев, отвечающих на более ранний комментарий ветки.
+REPLY_SHARE: float = 0.4
+IMAGE_POOL: int = 24
+IMAGE_SIZE = (640, 360)
+
+
+@dataclass(frozen=True)
+class Plan:
+    """Параметры генерации; одинаковый план даёт одинаковые строки
+    при любом числе процессов.
+    """
+    seed: int
+    users: int
+    groups: int
+    posts: int
+    comments: int
+    follows: int
+    first_user: int
+    first_group: int
+    first_post: int
+    first_comment: int
+    until: datetime
+    days: int
+    batch_size: int
+    password: str
+    image_share: float = 0.0
+    images: tuple = ()
+
+    @property
+    def since(self):
+        return self.until - timedelta(days=self.days)
+
+    def chunks(self, total):
+        return math.ceil(total / self.batch_size)
+
+    def bounds(self, total, index):
+        start = index * self.batch_size
+        return start, min(start + self.batch_size, total)
+
+
+def _rng(plan, kind, index):
+    return random.Random(f'{plan.seed}:{kind}:{index}')
+
+
+@lru_cache(maxsize=None)
+def _faker():
+    return Faker('ru_RU')
+
+
+def _seeded_faker(rng):
+    faker = _faker()
+    faker.seed_instance(rng.getrandbits(64))
+    return faker
+
+
+@lru_cache(maxsize=None)
+def _zipf_weights(size):
+    return list(itertools.accumulate(
+        1 / rank ** ZIPF_EXPONENT for rank in range(1, size + 1)
+    ))
+
+
+@lru_cache(maxsize=8)
+def _ranking(plan, kind, first, size):
+    """Перемешанные pk: популярными оказываются не первые объекты."""
+    ranking = list(range(first, first + size))
+    _rng(plan, kind, 'ranking').shuffle(ranking)
+    return ranking
+
+
+def _pick(rng, ranking, count):
+    return rng.choices(
+        ranking, cum_weights=_zipf_weights(len(ranking)), k=count
+    )
+
+
+def _share(total, parts, index):
+    """Доля index из total, поделённого на parts почти поровну."""
+    return total * (index + 1) // parts - total * index // parts
+
+
+def _spread(rng, total, size):
+    """Раскладывает total по size слотам с тяжёлым хвостом."""
+    weights = [rng.paretovariate(PARETO_ALPHA) for _ in range(size)]
+    return Counter(rng.choices(range(size), weights=weights, k=total))
+
+
+@lru_cache(maxsize=4)
+def _bursts(plan):
+    rng = _rng(plan, 'bursts', 0)
+    seconds = plan.days * 24 * 60 * 60
+    return sorted(
+        plan.since + timedelta(seconds=rng.uniform(0, seconds))
+        for _ in range(max(math.ceil(plan.posts / POSTS_PER_BURST), 1))
+    )
+
+
+def generate_users(plan, index):
+    rng = _rng(plan, 'users', index)
+    faker = _seeded_faker(rng)
+    start, stop = plan.bounds(plan.users, index)
+    rows = []
+    for number in range(start, stop):
+        pk = plan.first_user + number
+        rows.append({
+            'id': pk,
+            'username': f'user{pk}',
+            'first_name': faker.first_name(),
+            'last_name': faker.last_name(),
+            'email': f'user{pk}@example.com',
+            'password': plan.password,
+            'date_joined': plan.since - timedelta(
+                days=rng.uniform(0, plan.days)
+            ),
+        })
+    return rows
+
+
+def generate_groups(plan):
+    rng = _rng(plan, 'groups', 0)
+    faker = _seeded_faker(rng)
+    return [
+        {
+            'id': plan.first_group + number,
+            'title': faker.catch_phrase()[:200],
+            'slug': f'group-{plan.first_group + number}',
+            'description': faker.paragraph(nb_sentences=3),
+        }
+        for number in range(plan.groups)
+    ]
+
+
+def generate_posts(plan, index):
+    """Посты пачки и ветки комментариев к ним."""
+    rng = _rng(plan, 'posts', index)
+    faker = _seeded_faker(rng)
+    authors = _ranking(plan, 'authors', plan.first_user, plan.users)
+    commenters = _ranking(plan, 'commenters', plan.first_user, plan.users)
+    groups = _ranking(plan, 'groups', plan.first_group, plan.groups)
+    bursts = _bursts(plan)
+    start, stop = plan.bounds(plan.posts, index)
+    posts = []
+    for number in range(start, stop):
+        burst = bursts[number * len(bursts) // plan.posts]
+        pub_date = min(plan.until, burst + timedelta(
+            seconds=rng.expovariate(1 / BURST_GAP.total_seconds())
+        ))
+        image = ''
+        if plan.images and rng.random() < plan.image_share:
+            image = rng.choice(plan.images)
+        posts.append({
+            'id': plan.first_post + number,
+            'text': faker.paragraph(nb_sentences=rng.randint(1, 8)),
+            'pub_date': pub_date,
+            'edited': pub_date,
+            'author_id': _pick(rng, authors, 1)[0],
+            'group_id': (
+                _pick(rng, groups, 1)[0]
+                if groups and rng.random() < GROUP_SHARE else None
+            ),
+            'image': image,
+        })
+    comments = []
+    threads = _spread(
+        rng, _share(plan.comments, plan.chunks(plan.posts), index),
+        len(posts)
+    )
+    pks = itertools.count(
+        plan.first_comment
+        + plan.comments * index // plan.chunks(plan.posts)
+    )
+    for position, count in sorted(threads.items()):
+        post = posts[position]
+        created = sorted(
+            min(plan.until, post['pub_date'] + timedelta(
+                seconds=rng.expovariate(1 / COMMENT_DELAY.total_seconds())
+            ))
+            for _ in range(count)
+        )
+        thread = {}
+        for moment, author_id in zip(created, _pick(rng, commenters, count)):
+            parent = None
+            if thread and rng.random() < REPLY_SHARE:
+                parent = thread[rng.choice(list(thread))]
+                if len(parent['path']) > PATH_SEGMENT * MAX_COMMENT_DEPTH:
+                    parent = thread[parent['parent_id']]
+            comment = {
+                'id': next(pks),
+                'post_id': post['id'],
+                'author_id': author_id,
+                'text': faker.sentence(nb_words=rng.randint(3, 20)),
+                'created': moment,
+                'parent_id': parent and parent['id'],
+                'replies_count': 0,
+            }
+            comment['path'] = Comment.make_path(
+                parent['path'] if parent else '', comment['id']
+            )
+            thread[comment['id']] = comment
+            comments.append(comment)
+        by_path = {comment['path']: comment for comment in thread.values()}
+        for comment in thread.values():
+            for path in lineage(comment['path'])[:-1]:
+                by_path[path]['replies_count'] += 1
+    return posts, comments
+
+
+def generate_follows(plan, index):
+    """Подписки читателей пачки: популярные авторы собирают
+    большую часть подписчиков.
+    """
+    rng = _rng(plan, 'follows', index)
+    authors = _ranking(plan, 'followed', plan.first_user, plan.users)
+    start, stop = plan.bounds(plan.users, index)
+    wanted = _spread(
+        rng, _share(plan.follows, plan.chunks(plan.users), index),
+        stop - start
+    )
+    rows = []
+    for position, count in sorted(wanted.items()):
+        user_id = plan.first_user + start + position
+        count = min(count, plan.users - 1)
+        followed = set()
+        for author_id in _pick(rng, authors, 2 * count):
+            if len(followed) == count:
+                break
+            if author_id != user_id:
+                followed.add(author_id)
+        # Хвост распределения почти не выпадает, добираем равномерно.
+        while len(followed) < count:
+            author_id = plan.first_user + rng.randrange(plan.users)
+            if author_id != user_id:
+                followed.add(author_id)
+        rows += [
+            {'user_id': user_id, 'author_id': author_id}
+            for author_id in sorted(followed)
+        ]
+    return rows
+
+
+GENERATORS = {
+    'users': generate_users,
+    'posts': generate_posts,
+    'follows': generate_follows,
+}
+
+
+def generate(task):
+    kind, plan, index = task
+    return GENERATORS[kind](plan, index)
+
+
+@contextmanager
+def generator_pool(workers):
+    """Функция map для задач генерации: в этом процессе или в пуле.
+
+    Процессы только генерируют строки, в базу пишет вызывающий
+    процесс, поэтому SQLite не упирается в блокировки записи.
+    """
+    if workers <= 1:
+        yield map
+    else:
+        with multiprocessing.Pool(workers, initializer=django.setup) as pool:
+            yield lambda function, tasks: _windowed(
+                pool, function, tasks, workers * 2
+            )
+
+
+def _windowed(pool, function, tasks, size):
+    # Ограничивает число готовых пачек, ждущих записи в базу.
+    tasks = iter(tasks)
+    while True:
+        window = list(itertools.islice(tasks, size))
+        if not window:
+            return
+        yield from pool.imap(function, window)
+
+
+@contextmanager
+def explicit_dates():
+    """bulk_create сохраняет заданные даты вместо auto_now."""
+    fields = [
+        field
+        for model in (Post, Comment)
+        for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def create_images(seed, count=IMAGE_POOL):
+    """Набор картинок, которые посты делят между собой."""
+    rng = random.Random(f'{seed}:images')
+    storage = media.get_storage()
+    names = []
+    for _ in range(count):
+        image = Image.new('RGB', IMAGE_SIZE, tuple(
+            rng.randrange(256) for _ in range(3)
+        ))
+        draw = ImageDraw.Draw(image)
+        for _ in range(8):
+            x, y = rng.randrange(IMAGE_SIZE[0]), rng.randrange(IMAGE_SIZE[1])
+            draw.rectangle(
+                (x, y, x + rng.randrange(40, 200), y + rng.randrange(40, 200)),
+                fill=tuple(rng.randrange(256) for _ in range(3))
+            )
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', quality=85)
+        names.append(storage.save(
+            'posts/seed.jpg', ContentFile(buffer.getvalue())
+        ))
+    return tuple(names)
+
+
+def _next_pk(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+def _insert(model, rows):
+    # Размер запроса bulk_create подбирает под ограничения СУБД,
+    # а пачка целиком пишется одной транзакцией.
+    with transaction.atomic():
+        model.objects.bulk_create(model(**row) for row in rows)
+    return len(rows)
+
+
+def _reset_sequences(*models):
+    # Первичные ключи заданы явно, последовательности PostgreSQL
+    # нужно сдвинуть за них.
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(sql)
+
+
+def _analyze():
+    # Свежая статистика нужна планировщику и оценкам числа постов
+    # в паджинаторе (sqlite_stat1, pg_class).
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def seed_yatube(volumes=None, seed=0, workers=1, batch_size=BATCH_SIZE,
+                image_share=0.0, until=None, days=365, progress=None):
+    """Заполняет базу пачками bulk_create.
+
+    bulk_create не вызывает сигналы, поэтому ленты, счётчики, ссылки
+    на картинки и поисковый индекс заполняются после вставки.
+    Возвращает число созданных объектов по видам.
+    """
+    volumes = {**VOLUMES, **(volumes or {})}
+    progress = progress or (lambda kind, count: None)
+    if until is None:
+        until = timezone.now().replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+    plan = Plan(
+        seed=seed,
+        first_user=_next_pk(User),
+        first_group=_next_pk(Group),
+        first_post=_next_pk(Post),
+        first_comment=_next_pk(Comment),
+        until=until,
+        days=days,
+        batch_size=batch_size,
+        password=make_password(SEED_PASSWORD),
+        image_share=image_share,
+        **volumes
+    )
+    if plan.posts and not plan.users:
+        raise ValueError('Постам нужны авторы: задайте users больше нуля')
+    if image_share and plan.posts:
+        plan = replace(plan, images=create_images(seed))
+    created = dict.fromkeys(VOLUMES, 0)
+    backend = search.get_backend()
+    # Индекс дешевле построить заново, чем обновлять на каждой пачке.
+    backend.uninstall()
+    try:
+        with explicit_dates(), generator_pool(workers) as pool_map:
+            for rows in pool_map(generate, (
+                ('users', plan, index)
+                for index in range(plan.chunks(plan.users))
+            )):
+                created['users'] += _insert(User, rows)
+                progress('users', created['users'])
+            created['groups'] = _insert(Group, generate_groups(plan))
+            progress('groups', created['groups'])
+            for posts, comments in pool_map(generate, (
+                ('posts', plan, index)
+                for index in range(plan.chunks(plan.posts))
+            )):
+                created['posts'] += _insert(Post, posts)
+                created['comments'] += _insert(Comment, comments)
+                progress('posts', created['posts'])
+                progress('comments', created['comments'])
+            for rows in pool_map(generate, (
+                ('follows', plan, index)
+                for index in range(plan.chunks(plan.users))
+            )):
+                created['follows'] += _insert(Follow, rows)
+                progress('follows', created['follows'])
+    finally:
+        backend.install()
+    _reset_sequences(User, Group, Post, Comment)
+    recount_stats(User.objects.filter(pk__gte=plan.first_user))
+    fill_timelines(plan.first_post)
+    if plan.images:
+        media.recount_references()
+    _analyze()
+    bump_versions(FEED_VERSION)
+    return created
@@ -0,0 +1,177 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import media, search, stats, threads, thumbnails, timeline
+from .cache import (AUTHOR_VERSION, FEED_VERSION, GROUP_VERSION, POST_VERSION,
+                    bump_post_feeds, bump_versions)
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    if created:
+        timeline.fan_out_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def fill_timeline_on_follow(sender, instance, created, **kwargs):
+    if created:
+        timeline.add_author_posts(instance.user, instance.author)
+
+
+@receiver(post_delete, sender=Follow)
+def clear_timeline_on_unfollow(sender, instance, **kwargs):
+    timeline.remove_author_posts(instance.user_id, instance.author_id)
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_values(sender, instance, **kwargs):
+    previous = None
+    if instance.pk is not None:
+        previous = Post.objects.filter(
+            pk=instance.pk
+        ).values_list('group_id', 'image').first()
+    instance._previous_group_id, instance._previous_image = (
+        previous or (None, '')
+    )
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, **kwargs):
+    bump_post_feeds(
+        instance, getattr(instance, '_previous_group_id', None)
+    )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_feeds(sender, instance, **kwargs):
+    bump_versions(FEED_VERSION, GROUP_VERSION.format(slug=instance.slug))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_post_comments(sender, instance, **kwargs):
+    # Число комментариев выводится и в карточках лент.
+    post = Post.objects.filter(pk=instance.post_id).first()
+    if post is None:
+        bump_versions(POST_VERSION.format(post_id=instance.post_id))
+    else:
+        bump_post_feeds(post)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_author_profile(sender, instance, **kwargs):
+    # Меняются счётчики обоих профилей и лента подписчика.
+    usernames = User.objects.filter(
+        pk__in=(instance.author_id, instance.user_id)
+    ).values_list('username', flat=True)
+    bump_versions(
+        *(AUTHOR_VERSION.format(username=name) for name in usernames)
+    )
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, **kwargs):
+    if created:
+        stats.change_counters(instance.author_id, 1, 'posts_count')
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    stats.change_counters(instance.author_id, -1, 'posts_count')
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        stats.change_counters(instance.author_id, 1, 'comments_count')
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    stats.change_counters(instance.author_id, -1, 'comments_count')
+
+
+@receiver(post_save, sender=Comment)
+def count_new_reply(sender, instance, created, **kwargs):
+    # Путь нового ответа ещё не записан, предки — это родитель и его путь.
+    if created and instance.parent_id:
+        threads.change_replies_count(
+            threads.lineage(instance.parent.path), 1
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_reply(sender, instance, **kwargs):
+    if instance.parent_id:
+        threads.change_replies_count(
+            threads.lineage(instance.path)[:-1], -1
+        )
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, **kwargs):
+    if created:
+        stats.change_counters(instance.user_id, 1, 'following_count')
+        stats.change_counters(instance.author_id, 1, 'followers_count')
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    stats.change_counters(instance.user_id, -1, 'following_count')
+    stats.change_counters(instance.author_id, -1, 'followers_count')
+
+
+@receiver(post_delete, sender=Follow)
+def refill_timelines_under_limit(sender, instance, **kwargs):
+    # Счётчики к этому моменту уже сдвинуты count_deleted_follow.
+    timeline.rebalance_author(instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def index_post_text(sender, instance, **kwargs):
+    search.get_backend().index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def remove_post_text(sender, instance, **kwargs):
+    search.get_backend().remove_post(instance.pk)
+
+
+def image_changed(post):
+    return post.image.name != getattr(post, '_previous_image', '')
+
+
+@receiver(post_save, sender=Post)
+def pregenerate_thumbnails(sender, instance, **kwargs):
+    # Повторно загруженная картинка получает имя уже готового файла.
+    if (
+        instance.image and image_changed(instance)
+        and not thumbnails.is_ready(instance.image)
+    ):
+        thumbnails.schedule(instance.pk, instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+def count_image_references(sender, instance, **kwargs):
+    if not image_changed(instance):
+        return
+    if instance.image:
+        media.add_reference(instance.image.name)
+    if instance._previous_image:
+        media.release_reference(instance._previous_image)
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    if instance.image:
+        media.release_reference(instance.image.name)
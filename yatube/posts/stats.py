@@ -0,0 +1,86 @@
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, User, UserStats
+
+# Счётчик -> (модель, поле со ссылкой на пользователя).
+COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+    'comments_count': (Comment, 'author'),
+}
+RECOUNT_BATCH_SIZE: int = 1000
+
+
+def change_counters(user_id, delta, *counters):
+    """Атомарно сдвигает счётчики пользователя на delta."""
+    UserStats.objects.filter(user_id=user_id).update(
+        **{counter: F(counter) + delta for counter in counters}
+    )
+
+
+def _actual_count(model, field):
+    counted = model.objects.filter(
+        **{field: OuterRef('pk')}
+    ).order_by().values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counted), 0)
+
+
+def _with_counters(users):
+    return users.annotate(**{
+        counter: _actual_count(model, field)
+        for counter, (model, field) in COUNTERS.items()
+    })
+
+
+def recount_stats(users=None, batch_size=RECOUNT_BATCH_SIZE):
+    """Пересчитывает счётчики по таблицам и исправляет расхождения.
+
+    Возвращает число созданных или исправленных записей.
+    """
+    if users is None:
+        users = User.objects.all()
+    actual = _with_counters(users.order_by('pk')).values('pk', *COUNTERS)
+    fixed = 0
+    batch = []
+    for row in actual.iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) == batch_size:
+            fixed += _reconcile(batch)
+            batch = []
+    if batch:
+        fixed += _reconcile(batch)
+    return fixed
+
+
+def _reconcile(rows):
+    stored = UserStats.objects.in_bulk([row['pk'] for row in rows])
+    to_create, to_update = [], []
+    for row in rows:
+        counters = {counter: row[counter] for counter in COUNTERS}
+        stats = stored.get(row['pk'])
+        if stats is None:
+            to_create.append(UserStats(user_id=row['pk'], **counters))
+        elif any(getattr(stats, name) != value
+                 for name, value in counters.items()):
+            for name, value in counters.items():
+                setattr(stats, name, value)
+            to_update.append(stats)
+    UserStats.objects.bulk_create(to_create, ignore_conflicts=True)
+    UserStats.objects.bulk_update(to_update, list(COUNTERS))
+    return len(to_create) + len(to_update)
+
+
+def get_stats(user):
+    stats = UserStats.objects.filter(user=user).first()
+    if stats is not None:
+        return stats
+    # Счётчики и запись берутся из основной базы: в реплике только что
+    # созданной записи ещё может не быть.
+    counters = _with_counters(
+        User.objects.using(DEFAULT_DB_ALIAS).filter(pk=user.pk)
+    ).values(*COUNTERS).get()
+    stats, _ = UserStats.objects.get_or_create(user=user, defaults=counters)
+    return stats
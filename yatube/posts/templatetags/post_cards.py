@@ -0,0 +1,60 @@
+from django import template
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .. import thumbnails
+from ..cache import FEED_CACHE_SECONDS
+
+register = template.Library()
+
+CARD_TEMPLATE: str = 'posts/includes/post_card.html'
+PREFETCHED_CARDS: str = 'posts:prefetched_cards'
+# Карточки с заглушкой вместо миниатюры не кэшируются.
+PENDING_THUMBNAIL_MARKER: str = 'thumbnail-pending'
+
+
+def card_key(post, show_author):
+    variant = 'full' if show_author else 'short'
+    comments = getattr(post, 'comment_count', '')
+    return (
+        f'posts:card:{variant}:{post.pk}:{post.edited.timestamp()}:{comments}'
+    )
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post, show_author=True):
+    """Выводит карточку поста из кэша фрагментов.
+
+    При выводе первой карточки все карточки page_obj запрашиваются
+    из кэша одним get_many, промахи рендерятся и кэшируются по одной.
+    """
+    cards = context.render_context.get(PREFETCHED_CARDS)
+    if cards is None:
+        cards = cache.get_many([
+            card_key(page_post, show_author)
+            for page_post in context.get('page_obj', ())
+        ])
+        context.render_context[PREFETCHED_CARDS] = cards
+    key = card_key(post, show_author)
+    card = cards.get(key)
+    if card is None:
+        card = render_to_string(
+            CARD_TEMPLATE, {'post': post, 'show_author': show_author}
+        )
+        if PENDING_THUMBNAIL_MARKER not in card:
+            cache.set(key, card, FEED_CACHE_SECONDS)
+    return mark_safe(card)
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def responsive_image(image):
+    """Картинка поста в <picture> со всеми готовыми вариантами.
+
+    В запросе варианты не генерируются: недостающие ставятся
+    в очередь пула posts.thumbnails, а шаблон выводит заглушку.
+    """
+    picture = thumbnails.get_picture(image) if image else None
+    if image and picture is None:
+        thumbnails.schedule(image.instance.pk, image.name)
+    return {'picture': picture}
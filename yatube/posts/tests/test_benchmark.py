@@ -0,0 +1,57 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+
+from ..benchmark import SCENARIOS, Benchmark, compare, report, seed
+from ..models import Comment, Follow, Post, User
+
+
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.dataset = seed({
+            'users': 4, 'groups': 2, 'posts': 12, 'comments': 6,
+            'follows': 5,
+        })
+
+    def test_seed_creates_requested_volumes(self):
+        """seed() создаёт заданное число объектов каждого вида."""
+        self.assertEqual(User.objects.count(), 4)
+        self.assertEqual(Post.objects.count(), 12)
+        self.assertEqual(Comment.objects.count(), 6)
+        self.assertEqual(Follow.objects.count(), 5)
+
+    def test_all_scenarios_measured(self):
+        """Отчёт содержит p50, p99 и пропускную способность сценариев."""
+        results = Benchmark(self.dataset).run(iterations=3, warmup=1)
+        self.assertEqual(set(results), set(SCENARIOS))
+        for scenario, result in results.items():
+            with self.subTest(scenario=scenario):
+                self.assertEqual(result['requests'], 3)
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+                self.assertGreater(result['throughput_rps'], 0)
+
+    def test_compare_reports_changes(self):
+        """compare() показывает изменение задержек между запусками."""
+        results = Benchmark(self.dataset).run(('index',), iterations=2)
+        previous = report(self.dataset, results)
+        current = report(self.dataset, {'index': {
+            **results['index'],
+            'p50_ms': results['index']['p50_ms'] * 2,
+        }})
+        self.assertIn('+100%', compare(previous, current)[0])
+
+
+class BenchmarkCommandTests(TransactionTestCase):
+    def test_cold_cache_keeps_site_cache(self):
+        """--cold-cache очищает кэш бенчмарка, а не кэш сайта."""
+        cache.set('site:page', 'html')
+        call_command(
+            'benchmark', '--users', '2', '--groups', '1', '--posts', '2',
+            '--comments', '1', '--follows', '1', '--scenario', 'index',
+            '--iterations', '1', '--warmup', '0', '--cold-cache',
+            stdout=StringIO()
+        )
+        self.assertEqual(cache.get('site:page'), 'html')
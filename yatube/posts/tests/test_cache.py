@@ -1,7 +1,20 @@
+import threading
+import time
+from http import HTTPStatus
+from unittest.mock import patch
+
+from core.replicas import PIN_COOKIE
+from django.contrib.auth.models import AnonymousUser
 from django.core.cache import cache
-from django.test import Client, TestCase
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase
+from django.urls import reverse
 
-from ..models import Post, User
+from ..cache import (ANONYMOUS_MAX_AGE, FEED_VERSION, PAGE_LOCK_KEY,
+                     bump_versions, cache_feed, get_versions, is_fresh,
+                     page_key)
+from ..models import Comment, Follow, Group, Post, User
+from ..templatetags.post_cards import card_key
 
 
 class CacheTests(TestCase):
@@ -10,38 +23,375 @@ class CacheTests(TestCase):
         super().setUpClass()
         cls.FIRST_OBJECT_INDEX = 0
         cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
         cls.first_post = Post.objects.create(
             author=cls.user,
             text='Тестовый пост Тестовый пост Тестовый пост',
+            group=cls.group,
         )
         cls.second_post = Post.objects.create(
             author=cls.user,
             text='Тестовый2пост2Тестовый2пост2Тестовый2пост',
+            group=cls.group,
         )
 
     def setUp(self):
+        cache.clear()
         self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_page_in_cache_until_write(self):
+        """Изменения в обход ORM-сигналов не видны, пока страница
+        лежит в кэше.
+        """
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response_before = self.guest_client.get(url)
+                Post.objects.filter(pk=self.second_post.pk).update(
+                    text='Изменено без сигналов'
+                )
+                response_after = self.guest_client.get(url)
+                self.assertEqual(
+                    response_before.content,
+                    response_after.content
+                )
+                Post.objects.filter(pk=self.second_post.pk).update(
+                    text=self.second_post.text
+                )
 
-    def test_post_in_cache_until_clean(self):
-        """При удалении поста из базы, он остаётся на главной странице
-        до тех пор, пока кэш не будет очищен принудительно."""
+    def test_post_delete_invalidates_feeds(self):
+        """При удалении поста главная страница обновляется сразу."""
         response_before_delete = self.guest_client.get('/')
         self.second_post.delete()
         response_after_delete = self.guest_client.get('/')
-        self.assertEqual(
-            response_before_delete.content,
-            response_after_delete.content
-        )
-        cache.clear()
-        response_after_cacheclear = self.guest_client.get('/')
         self.assertNotEqual(
             response_before_delete.content,
-            response_after_cacheclear.content
+            response_after_delete.content
         )
-        first_object = response_after_cacheclear.context[
+        first_object = response_after_delete.context[
             'page_obj'
         ][self.FIRST_OBJECT_INDEX]
         self.assertEqual(
             first_object.text,
             'Тестовый пост Тестовый пост Тестовый пост'
         )
+
+    def test_post_edit_invalidates_group_page(self):
+        """Смена группы поста обновляет страницу прежней группы."""
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        self.guest_client.get(url)
+        post = Post.objects.get(pk=self.first_post.pk)
+        post.group = None
+        post.save()
+        response = self.guest_client.get(url)
+        self.assertEqual(len(response.context['page_obj']), 1)
+
+    def test_follow_invalidates_profile(self):
+        """Подписка обновляет кнопку на странице автора."""
+        url = reverse('posts:profile', kwargs={'username': self.user.username})
+        self.reader_client.get(url)
+        Follow.objects.create(user=self.reader, author=self.user)
+        response = self.reader_client.get(url)
+        self.assertContains(response, 'Отписаться')
+
+    def test_comment_invalidates_feeds(self):
+        """Новый и удалённый комментарий меняют счётчик в лентах."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+        )
+        for url in urls:
+            self.guest_client.get(url)
+        comment = Comment.objects.create(
+            post=self.first_post, author=self.reader, text='Комментарий'
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.guest_client.get(url), 'Комментариев: 1'
+                )
+        comment.delete()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNotContains(
+                    self.guest_client.get(url), 'Комментариев: 1'
+                )
+
+    def test_pages_are_cached_per_viewer(self):
+        """Авторизованный пользователь не получает страницу гостя."""
+        self.guest_client.get('/')
+        response = self.reader_client.get('/')
+        self.assertContains(response, self.reader.username)
+
+    def test_post_card_rendered_from_fragment_cache(self):
+        """Карточка поста берётся из кэша фрагментов по ключу поста."""
+        first_post, second_post = Post.objects.for_feed().filter(
+            pk__in=(self.first_post.pk, self.second_post.pk)
+        ).order_by('pk')
+        cache.set(card_key(first_post, True), '<p>из кэша</p>')
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, '<p>из кэша</p>')
+        self.assertIsNotNone(cache.get(card_key(second_post, True)))
+
+    def test_post_edit_changes_card_key(self):
+        """После редактирования поста карточка рендерится заново."""
+        key_before_edit = card_key(self.first_post, True)
+        post = Post.objects.get(pk=self.first_post.pk)
+        post.text = 'Отредактированный пост'
+        post.save()
+        self.assertNotEqual(card_key(post, True), key_before_edit)
+
+
+class HolePunchingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(
+            author=cls.author, text='<!--hole:includes/header.html?-->'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def test_page_rendered_once_for_all_viewers(self):
+        """Гость и пользователь получают одну страницу из кэша со своими
+        шапкой и переключателем лент.
+        """
+        guest = self.client.get(reverse('posts:index'))
+        self.assertNotContains(guest, 'Избранные авторы')
+        response = self.reader_client.get(reverse('posts:index'))
+        self.assertNotIn('page_obj', response.context)
+        self.assertContains(response, 'Пользователь: reader')
+        self.assertContains(response, 'Избранные авторы')
+        self.assertNotContains(self.client.get('/'), 'Пользователь:')
+
+    def test_follow_button_per_viewer(self):
+        """Кнопка подписки на общей странице профиля своя у каждого."""
+        url = reverse('posts:profile', args=(self.author.username,))
+        self.assertContains(self.reader_client.get(url), 'Отписаться')
+        self.assertContains(self.author_client.get(url), 'Подписаться')
+
+    def test_marker_in_post_text_not_filled(self):
+        """Метка в тексте поста экранируется и не заменяется."""
+        response = self.reader_client.get(reverse('posts:index'))
+        self.assertContains(
+            response, '&lt;!--hole:includes/header.html?--&gt;'
+        )
+        self.assertContains(response, 'Пользователь: reader', count=1)
+
+
+class StampedeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Первый пост')
+
+    def setUp(self):
+        cache.clear()
+        request = RequestFactory().get(reverse('posts:index'))
+        request.user = AnonymousUser()
+        self.lock = PAGE_LOCK_KEY.format(key=page_key(request))
+
+    def test_one_request_renders_expired_page(self):
+        """Одновременные промахи рендерят страницу один раз."""
+        renders = []
+
+        @cache_feed()
+        def slow_view(request):
+            renders.append(request)
+            time.sleep(0.2)
+            return HttpResponse('страница')
+
+        def get_page():
+            request = RequestFactory().get('/slow/')
+            request.user = AnonymousUser()
+            responses.append(slow_view(request).content)
+
+        responses = []
+        threads = [threading.Thread(target=get_page) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(renders), 1)
+        self.assertEqual(responses, ['страница'.encode()] * 5)
+
+    def test_stale_page_served_while_locked(self):
+        """Пока страницу пересчитывает другой запрос, отдаётся прежняя."""
+        self.client.get(reverse('posts:index'))
+        Post.objects.create(author=self.user, text='Второй пост')
+        cache.add(self.lock, True)
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotIn('page_obj', response.context)
+        self.assertNotContains(response, 'Второй пост')
+        cache.delete(self.lock)
+        self.assertContains(
+            self.client.get(reverse('posts:index')), 'Второй пост'
+        )
+
+    def test_pinned_client_skips_stale_page(self):
+        """Клиент, закреплённый после записи, не получает прежнюю
+        страницу, пока её пересчитывает другой запрос.
+        """
+        self.client.get(reverse('posts:index'))
+        Post.objects.create(author=self.user, text='Второй пост')
+        cache.add(self.lock, True)
+        self.client.cookies[PIN_COOKIE] = str(time.time() + 60)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Второй пост')
+
+    @patch('posts.cache.PAGE_WAIT_SECONDS', 0.1)
+    def test_renders_after_waiting(self):
+        """Без прежней страницы запрос ждёт, а не дождавшись, рендерит."""
+        cache.add(self.lock, True)
+        response = self.client.get(reverse('posts:index'))
+        self.assertIsNotNone(response.context)
+
+    def test_early_expiration(self):
+        """Долго рендерящаяся страница может пересчитаться до срока,
+        старая версия — всегда.
+        """
+        entry = {'versions': [1], 'expires': 100, 'duration': 2}
+        with patch('posts.cache.random') as random:
+            random.random.return_value = 0.0
+            self.assertTrue(is_fresh(entry, [1], now=99))
+            self.assertFalse(is_fresh(entry, [2], now=0))
+            random.random.return_value = 0.9
+            self.assertFalse(is_fresh(entry, [1], now=99))
+            self.assertTrue(is_fresh(entry, [1], now=90))
+
+
+class ConditionalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def revalidate(self, url, response, client=None):
+        return (client or self.client).get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+
+    def test_not_modified_without_queries(self):
+        """Гость с актуальным ETag получает 304 без запросов к базе."""
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        self.assertEqual(
+            response['Cache-Control'], f'public, max-age={ANONYMOUS_MAX_AGE}'
+        )
+        with self.assertNumQueries(0):
+            not_modified = self.revalidate(url, response)
+        self.assertEqual(not_modified.status_code, HTTPStatus.NOT_MODIFIED)
+        Post.objects.create(author=self.author, text='Новый пост')
+        self.assertEqual(
+            self.revalidate(url, response).status_code, HTTPStatus.OK
+        )
+
+    def test_authenticated_pages_are_private(self):
+        """Страницы пользователя не кэшируются CDN и не совпадают
+        по ETag со страницами гостя.
+        """
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        guest = self.client.get(url)
+        # Первый ответ выдаёт cookie CSRF, от которой зависит ETag.
+        self.reader_client.get(url)
+        response = self.reader_client.get(url)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        self.assertNotEqual(response['ETag'], guest['ETag'])
+        self.assertEqual(
+            self.revalidate(url, response, self.reader_client).status_code,
+            HTTPStatus.NOT_MODIFIED
+        )
+        Comment.objects.create(post=self.post, author=self.reader, text='!')
+        self.assertEqual(
+            self.revalidate(url, response, self.reader_client).status_code,
+            HTTPStatus.OK
+        )
+
+    def test_follow_changes_validators(self):
+        """Подписка меняет ETag ленты подписок и профиля автора."""
+        urls = (
+            reverse('posts:follow_index'),
+            reverse('posts:profile', args=(self.author.username,)),
+        )
+        responses = [self.reader_client.get(url) for url in urls]
+        Follow.objects.create(user=self.reader, author=self.author)
+        for url, response in zip(urls, responses):
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.revalidate(
+                        url, response, self.reader_client
+                    ).status_code,
+                    HTTPStatus.OK
+                )
+
+    def test_stale_page_has_no_validators(self):
+        """Устаревшая страница на время пересчёта не получает ETag."""
+        url = reverse('posts:index')
+        self.client.get(url)
+        Post.objects.create(author=self.author, text='Новый пост')
+        request = RequestFactory().get(url)
+        request.user = AnonymousUser()
+        cache.add(PAGE_LOCK_KEY.format(key=page_key(request)), True)
+        response = self.client.get(url)
+        self.assertFalse(response.has_header('ETag'))
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+
+    def test_last_modified_only_after_its_second(self):
+        """Last-Modified не выдаётся, пока идёт секунда изменения, и
+        не даёт ложного 304 после изменения в следующей.
+        """
+        url = reverse('posts:index')
+        second = 1700000000000
+        with patch('posts.cache._now_version', return_value=second + 100):
+            bump_versions(FEED_VERSION)
+            self.assertFalse(self.client.get(url).has_header('Last-Modified'))
+        with patch('posts.cache._now_version', return_value=second + 1100):
+            last_modified = self.client.get(url)['Last-Modified']
+            self.assertEqual(
+                self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=last_modified
+                ).status_code,
+                HTTPStatus.NOT_MODIFIED
+            )
+        with patch('posts.cache._now_version', return_value=second + 1200):
+            bump_versions(FEED_VERSION)
+        with patch('posts.cache._now_version', return_value=second + 2100):
+            self.assertEqual(
+                self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=last_modified
+                ).status_code,
+                HTTPStatus.OK
+            )
+
+    def test_versions_follow_clock(self):
+        """Версия после изменения не меньше текущего времени и растёт."""
+        before = get_versions(FEED_VERSION)[0]
+        bump_versions(FEED_VERSION)
+        after = get_versions(FEED_VERSION)[0]
+        self.assertGreater(after, before)
+        self.assertLessEqual(after, time.time() * 1000 + 1)
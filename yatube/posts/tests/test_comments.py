@@ -1,7 +1,10 @@
 from django.test import Client, TestCase
 from django.urls import reverse
 
-from ..models import Post, User
+from ..models import MAX_COMMENT_DEPTH, Comment, Post, User
+from ..threads import FIRST_REPLIES
+from ..views import COMMENTS_VOLUME
+from .utils import QueryBudgetMixin
 
 
 class PostsURLTests(TestCase):
@@ -42,3 +45,164 @@ class PostsURLTests(TestCase):
         comment = response.context['comments'][self.FIRST_OBJECT_INDEX]
         self.assertEqual(self.post.comments.count(), comment_count + 1)
         self.assertEqual(comment.text, form_data['text'])
+
+
+class CommentPaginationTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.COMMENTS_QUERY_BUDGET = 6
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Вирусный пост')
+        cls.comments = []
+        for i in range(COMMENTS_VOLUME + 5):
+            commenter = User.objects.create_user(username=f'reader_{i}')
+            cls.comments.append(Comment.objects.create(
+                post=cls.post, author=commenter, text=f'Комментарий {i}'
+            ))
+
+    def setUp(self):
+        self.client = Client()
+        self.url = reverse('posts:post_detail', args=(self.post.pk,))
+
+    def test_first_page_oldest_first(self):
+        """На странице поста первая страница комментариев от старых."""
+        with self.assert_query_budget(self.COMMENTS_QUERY_BUDGET):
+            response = self.client.get(self.url)
+        page = response.context['comments']
+        self.assertEqual(list(page), self.comments[:COMMENTS_VOLUME])
+        self.assertTrue(page.has_next())
+
+    def test_newest_order(self):
+        """?order=newest показывает сначала новые комментарии."""
+        response = self.client.get(self.url, {'order': 'newest'})
+        self.assertEqual(
+            list(response.context['comments']),
+            self.comments[::-1][:COMMENTS_VOLUME]
+        )
+
+    def test_fragment_returns_next_page(self):
+        """Фрагмент по курсору отдаёт оставшиеся комментарии без
+        обёртки страницы.
+        """
+        page = self.client.get(self.url).context['comments']
+        response = self.client.get(
+            reverse('posts:comments', args=(self.post.pk,)),
+            {'cursor': page.next_cursor}
+        )
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertEqual(
+            list(response.context['comments']),
+            self.comments[COMMENTS_VOLUME:]
+        )
+        self.assertFalse(response.context['comments'].has_next())
+
+    def test_fragment_for_missing_post(self):
+        """Фрагмент комментариев несуществующего поста — 404."""
+        response = self.client.get(reverse('posts:comments', args=(0,)))
+        self.assertEqual(response.status_code, 404)
+
+
+class CommentThreadTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.THREAD_QUERY_BUDGET = 8
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Обсуждение')
+        cls.other_post = Post.objects.create(author=cls.user, text='Другой')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def reply(self, parent=None, text='Ответ'):
+        return Comment.objects.create(
+            post=self.post, author=self.user, parent=parent, text=text
+        )
+
+    def test_reply_path_and_counts(self):
+        """Путь ответа продолжает путь родителя, а предки считают
+        ответы всего поддерева.
+        """
+        root = self.reply()
+        child = self.reply(root)
+        grandchild = self.reply(child)
+        self.assertTrue(grandchild.path.startswith(child.path))
+        self.assertEqual(grandchild.depth, 2)
+        root.refresh_from_db()
+        child.refresh_from_db()
+        self.assertEqual((root.replies_count, child.replies_count), (2, 1))
+        child.delete()
+        root.refresh_from_db()
+        self.assertEqual(root.replies_count, 0)
+        self.assertFalse(Comment.objects.filter(pk=grandchild.pk).exists())
+
+    def test_depth_is_limited(self):
+        """Ответ на самый глубокий комментарий становится его соседом."""
+        comment = self.reply()
+        for _ in range(MAX_COMMENT_DEPTH):
+            comment = self.reply(comment)
+        self.assertEqual(comment.depth, MAX_COMMENT_DEPTH)
+        sibling = self.reply(comment)
+        self.assertEqual(sibling.parent_id, comment.parent_id)
+        self.assertEqual(sibling.depth, MAX_COMMENT_DEPTH)
+
+    def test_threads_with_first_replies_fit_budget(self):
+        """Ветки с первыми ответами выбираются за постоянное число
+        запросов независимо от числа веток.
+        """
+        roots = [self.reply(text=f'Ветка {i}') for i in range(5)]
+        for root in roots:
+            parent = root
+            for _ in range(FIRST_REPLIES + 1):
+                parent = self.reply(parent)
+        with self.assert_query_budget(self.THREAD_QUERY_BUDGET):
+            response = self.client.get(
+                reverse('posts:post_detail', args=(self.post.pk,))
+            )
+        page = response.context['comments']
+        self.assertEqual(list(page), roots)
+        for root in page:
+            self.assertEqual(len(root.first_replies), FIRST_REPLIES)
+            self.assertEqual(root.replies_count, FIRST_REPLIES + 1)
+            self.assertEqual(
+                [reply.depth for reply in root.first_replies],
+                list(range(1, FIRST_REPLIES + 1))
+            )
+
+    def test_replies_fragment_returns_rest_of_thread(self):
+        """Фрагмент ответов отдаёт поддерево после показанного ответа."""
+        root = self.reply()
+        first = self.reply(root)
+        nested = self.reply(first)
+        second = self.reply(root)
+        response = self.client.get(
+            reverse('posts:comment_replies', args=(self.post.pk, root.pk)),
+            {'after': first.path}
+        )
+        self.assertEqual(list(response.context['replies']), [nested, second])
+
+    def test_reply_to_other_post_rejected(self):
+        """Нельзя ответить на комментарий другого поста."""
+        foreign = Comment.objects.create(
+            post=self.other_post, author=self.user, text='Чужой'
+        )
+        response = self.client.post(
+            reverse('posts:add_comment', args=(self.post.pk,)),
+            {'text': 'Ответ', 'parent': foreign.pk}
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(self.post.comments.exists())
+
+    def test_reply_form_posts_reply(self):
+        """Ответ из формы сохраняется в ветке родителя."""
+        root = self.reply()
+        self.client.post(
+            reverse('posts:add_comment', args=(self.post.pk,)),
+            {'text': 'Ответ из формы', 'parent': root.pk}
+        )
+        reply = Comment.objects.get(text='Ответ из формы')
+        self.assertEqual(reply.parent, root)
+        self.assertTrue(reply.path.startswith(root.path))
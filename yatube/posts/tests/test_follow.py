@@ -1,7 +1,11 @@
+from unittest.mock import patch
+
+from django.db import IntegrityError, transaction
 from django.test import Client, TestCase
 from django.urls import reverse
 
-from ..models import Follow, Post, User
+from .. import timeline
+from ..models import Follow, Post, TimelineEntry, User
 
 
 class FollowURLTests(TestCase):
@@ -95,3 +99,105 @@ class FollowURLTests(TestCase):
             response_before_new_post.content,
             response_after_new_post.content
         )
+
+    def test_follow_fills_and_clears_timeline(self):
+        """Подписка раскладывает посты автора в ленту, отписка убирает."""
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.follower_user, post=self.first_post
+        ).exists())
+        self.follower_client.get(reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': self.author_user.username}
+        ))
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.follower_user).exists()
+        )
+
+    def test_popular_author_posts_are_read_without_fanout(self):
+        """Посты авторов сверх лимита подписчиков не раскладываются
+        по лентам, но попадают в ленту подписок при чтении.
+        """
+        with patch.object(timeline, 'FANOUT_FOLLOWERS_LIMIT', 0):
+            second_post = Post.objects.create(
+                author=self.author_user,
+                text='Тестовый2пост2Тестовый2пост2Тестовый2пост',
+            )
+            self.assertFalse(
+                TimelineEntry.objects.filter(post=second_post).exists()
+            )
+            response = self.follower_client.get(reverse(
+                'posts:follow_index'
+            ))
+        self.assertEqual(
+            list(response.context['page_obj']),
+            [second_post, self.first_post]
+        )
+
+    def test_follow_feed_pages_over_timeline_entries(self):
+        """Лента подписок листается курсором и номерами страниц
+        по записям ленты вместе с постами популярных авторов.
+        """
+        popular_author = User.objects.create_user(username='popular')
+        Follow.objects.create(user=self.follower_user, author=popular_author)
+        for i in range(1, 7):
+            Post.objects.create(author=self.author_user, text=f'{i}_Пост')
+        with patch.object(timeline, 'FANOUT_FOLLOWERS_LIMIT', 1):
+            Follow.objects.create(
+                user=self.non_follower_user, author=popular_author
+            )
+            for i in range(1, 7):
+                Post.objects.create(author=popular_author, text=f'{i}_Пост')
+            url = reverse('posts:follow_index')
+            first_page = self.follower_client.get(url).context['page_obj']
+            second_page = self.follower_client.get(
+                f'{url}?cursor={first_page.next_cursor}'
+            ).context['page_obj']
+            numbered_page = self.follower_client.get(
+                f'{url}?page=2'
+            ).context['page_obj']
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.follower_user, post__author=popular_author
+        ).exists())
+        self.assertEqual(len(first_page), 10)
+        self.assertEqual(list(second_page), list(numbered_page))
+        self.assertEqual(
+            list(first_page) + list(second_page),
+            list(Post.objects.order_by('-pub_date', '-pk'))
+        )
+
+    def test_author_back_under_limit_keeps_posts_in_feed(self):
+        """Посты, опубликованные сверх лимита подписчиков, остаются
+        в ленте, когда автор возвращается под лимит.
+        """
+        with patch.object(timeline, 'FANOUT_FOLLOWERS_LIMIT', 1):
+            Follow.objects.create(
+                user=self.non_follower_user, author=self.author_user
+            )
+            second_post = Post.objects.create(
+                author=self.author_user, text='Пост сверх лимита'
+            )
+            self.assertFalse(
+                TimelineEntry.objects.filter(post=second_post).exists()
+            )
+            Follow.objects.filter(user=self.non_follower_user).delete()
+            response = self.follower_client.get(reverse(
+                'posts:follow_index'
+            ))
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.follower_user, post=second_post
+        ).exists())
+        self.assertEqual(
+            list(response.context['page_obj']),
+            [second_post, self.first_post]
+        )
+
+    def test_follow_pair_is_unique(self):
+        """Повторная подписка и подписка на себя отклоняются базой."""
+        for user, author in (
+            (self.follower_user, self.author_user),
+            (self.author_user, self.author_user),
+        ):
+            with self.subTest(user=user, author=author):
+                with self.assertRaises(IntegrityError):
+                    with transaction.atomic():
+                        Follow.objects.create(user=user, author=author)
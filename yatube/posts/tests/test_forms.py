@@ -69,7 +69,7 @@ class PostFormTests(TestCase):
             Post.objects.filter(
                 group=self.group.pk,
                 text='Текст из формы Create',
-                image='posts/small.gif'
+                image__regex=r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$'
             ).exists()
         )
 
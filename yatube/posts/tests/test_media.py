@@ -0,0 +1,159 @@
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+from sorl.thumbnail import default
+
+from .. import media, thumbnails
+from ..models import MediaFile, Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+OTHER_GIF = SMALL_GIF.replace(b'\xFF\xFF\xFF', b'\x00\x00\xFF')
+
+
+class MediaTestMixin:
+    def create_post(self, name, content=SMALL_GIF):
+        return Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(name, content, 'image/gif')
+        )
+
+    def refs(self, name):
+        return MediaFile.objects.get(name=name).refs
+
+    def thumbnail_name(self, post):
+        geometry, options = thumbnails.variant_geometry(
+            thumbnails.FALLBACK_WIDTH, thumbnails.FALLBACK_FORMAT
+        )
+        return thumbnails.backend.get_ready_thumbnail(
+            post.image, geometry, **options
+        ).name
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTests(MediaTestMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_same_content_stored_once(self):
+        """Одинаковые картинки хранятся в одном файле с двумя ссылками."""
+        first = self.create_post('meme.gif')
+        second = self.create_post('repost.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(self.refs(first.image.name), 2)
+        directory = os.path.dirname(first.image.path)
+        self.assertEqual(os.listdir(directory), [
+            os.path.basename(first.image.name)
+        ])
+
+    def test_duplicate_not_rethumbnailed(self):
+        """Для повторной картинки миниатюры не ставятся в очередь."""
+        self.create_post('meme.gif')
+        with patch.object(thumbnails, 'schedule') as schedule:
+            self.create_post('repost.gif')
+        schedule.assert_not_called()
+
+    def test_collect_media_fixes_references(self):
+        """collect_media пересчитывает ссылки и удаляет старые файлы
+        без постов.
+        """
+        post = self.create_post('meme.gif')
+        MediaFile.objects.filter(name=post.image.name).update(refs=5)
+        storage = media.get_storage()
+        orphan = storage.save('posts/orphan.gif', ContentFile(OTHER_GIF))
+        hour_ago = time.time() - 2 * media.SWEEP_GRACE.total_seconds()
+        os.utime(storage.path(orphan), (hour_ago, hour_ago))
+        fresh = storage.save('posts/fresh.gif', ContentFile(b'fresh'))
+        call_command('collect_media', stdout=StringIO())
+        self.assertEqual(self.refs(post.image.name), 1)
+        self.assertFalse(storage.exists(orphan))
+        self.assertTrue(storage.exists(fresh))
+        self.assertTrue(storage.exists(post.image.name))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@patch.object(media, 'UPLOAD_GRACE', timedelta(0))
+class MediaGarbageCollectionTests(MediaTestMixin, TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='auth')
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_file_deleted_with_last_post(self):
+        """Файл и миниатюры удаляются вместе с последним постом."""
+        first = self.create_post('meme.gif')
+        second = self.create_post('repost.gif')
+        storage = media.get_storage()
+        thumbnail = self.thumbnail_name(first)
+        first.delete()
+        self.assertTrue(storage.exists(second.image.name))
+        second.delete()
+        self.assertFalse(storage.exists(second.image.name))
+        self.assertFalse(default.storage.exists(thumbnail))
+        self.assertFalse(
+            MediaFile.objects.filter(name=second.image.name).exists()
+        )
+
+    def test_reuploaded_file_survives_last_reference(self):
+        """Файл, заново загруженный, пока удаляется последний пост
+        с ним, остаётся для нового поста.
+        """
+        post = self.create_post('meme.gif')
+        storage = media.get_storage()
+        uploaded = time.time() - 3600
+        os.utime(storage.path(post.image.name), (uploaded, uploaded))
+        name = storage.save('posts/again.gif', ContentFile(SMALL_GIF))
+        self.assertEqual(name, post.image.name)
+        with patch.object(media, 'UPLOAD_GRACE', timedelta(minutes=10)):
+            post.delete()
+        self.assertTrue(storage.exists(name))
+        reposted = self.create_post('again.gif')
+        self.assertEqual(self.refs(reposted.image.name), 1)
+
+    def test_replaced_image_deleted_on_edit(self):
+        """Картинка, заменённая в post_edit, удаляется."""
+        post = self.create_post('old.gif')
+        old_name = post.image.name
+        client = Client()
+        client.force_login(self.user)
+        client.post(reverse('posts:post_edit', args=(post.pk,)), data={
+            'text': 'Новая картинка',
+            'image': SimpleUploadedFile('new.gif', OTHER_GIF, 'image/gif'),
+        })
+        post.refresh_from_db()
+        self.assertNotEqual(post.image.name, old_name)
+        self.assertFalse(media.get_storage().exists(old_name))
+        self.assertEqual(self.refs(post.image.name), 1)
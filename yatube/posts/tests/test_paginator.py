@@ -0,0 +1,160 @@
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..cache import FEED_VERSION
+from ..counts import COUNT_ESTIMATE_THRESHOLD, estimate_count, feed_count
+from ..models import Post, User
+from ..paginator import KeysetPaginator, page_window
+
+
+class KeysetPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.PAGE_VOLUME = 10
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'{i}_Тестовый пост')
+            for i in range(1, 16)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.paginator = KeysetPaginator(Post.objects.all(), self.PAGE_VOLUME)
+
+    def test_first_page_without_count(self):
+        """Первая страница выбирается одним запросом без COUNT(*)."""
+        with self.assertNumQueries(1):
+            page = self.paginator.get_page(None)
+        self.assertEqual(len(page), self.PAGE_VOLUME)
+        self.assertTrue(page.has_next())
+        self.assertFalse(page.has_previous())
+        self.assertIsNotNone(page.next_cursor)
+
+    def test_next_and_previous_cursor(self):
+        """Курсоры ведут на следующую и обратно на предыдущую страницу."""
+        first_page = self.paginator.get_page(None)
+        second_page = KeysetPaginator(
+            Post.objects.all(), self.PAGE_VOLUME
+        ).get_page(cursor=first_page.next_cursor)
+        self.assertEqual(second_page.number, 2)
+        self.assertEqual(len(second_page), 5)
+        self.assertFalse(second_page.has_next())
+        self.assertFalse(set(first_page) & set(second_page))
+        back_page = KeysetPaginator(
+            Post.objects.all(), self.PAGE_VOLUME
+        ).get_page(cursor=second_page.previous_cursor)
+        self.assertEqual(back_page.number, 1)
+        self.assertEqual(list(back_page), list(first_page))
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        """Некорректный курсор отдаёт первую страницу."""
+        page = self.paginator.get_page(None, cursor='broken')
+        self.assertEqual(page.number, 1)
+        self.assertEqual(page[0].text, '15_Тестовый пост')
+
+    def test_cursor_link_on_index(self):
+        """Ссылка «Следующая» на главной ведёт на курсорную страницу."""
+        response = self.guest_client.get(reverse('posts:index'))
+        next_cursor = response.context['page_obj'].next_cursor
+        self.assertContains(response, f'?cursor={next_cursor}')
+        response = self.guest_client.get(
+            reverse('posts:index') + f'?cursor={next_cursor}'
+        )
+        self.assertEqual(len(response.context['page_obj']), 5)
+
+
+class PageCountTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.PAGE_VOLUME = 10
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'{i}_Тестовый пост')
+            for i in range(1, 36)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_page_window(self):
+        """Окно номеров: края, соседи текущей и пропуски."""
+        cases = (
+            (1, 1, [1]),
+            (1, 10, [1, 2, 3, None, 10]),
+            (6, 20, [1, None, 4, 5, 6, 7, 8, None, 20]),
+            (19, 20, [1, None, 17, 18, 19, 20]),
+            (3, None, [1, 2, 3, 4, 5, None]),
+        )
+        for number, last, expected in cases:
+            with self.subTest(number=number, last=last):
+                self.assertEqual(page_window(number, last), expected)
+
+    def test_count_cached_until_versions_change(self):
+        """Число постов кэшируется и пересчитывается после записи."""
+        self.assertEqual(
+            feed_count(Post.objects.all(), (FEED_VERSION,)), (35, False)
+        )
+        with self.assertNumQueries(0):
+            feed_count(Post.objects.all(), (FEED_VERSION,))
+        Post.objects.create(author=self.user, text='Новый пост')
+        self.assertEqual(
+            feed_count(Post.objects.all(), (FEED_VERSION,)), (36, False)
+        )
+
+    def test_estimate_above_threshold(self):
+        """Выше порога берётся оценка, последние страницы не
+        показываются.
+        """
+        estimate = COUNT_ESTIMATE_THRESHOLD * 2
+        with patch('posts.counts.estimate_count', return_value=estimate):
+            paginator = KeysetPaginator(
+                Post.objects.all(), self.PAGE_VOLUME,
+                count_list=Post.objects.all()
+            )
+            page = paginator.get_page(None)
+            self.assertEqual(page.window, [1, 2, 3, None])
+        self.assertEqual(paginator.count, estimate)
+        self.assertTrue(paginator.count_is_estimated)
+
+    def test_page_past_estimate_clamped(self):
+        """Номер за настоящим концом ленты при оценке числа строк
+        отдаёт последнюю страницу по точному числу.
+        """
+        estimate = COUNT_ESTIMATE_THRESHOLD * 2
+        with patch('posts.counts.estimate_count', return_value=estimate):
+            paginator = KeysetPaginator(
+                Post.objects.all(), self.PAGE_VOLUME,
+                count_list=Post.objects.all(), count_scopes=(FEED_VERSION,)
+            )
+            page = paginator.get_page(50)
+        self.assertEqual(page.number, 4)
+        self.assertEqual(len(page), 5)
+        self.assertFalse(page.has_next())
+        self.assertEqual(page.window, [1, 2, 3, 4])
+        self.assertEqual(
+            feed_count(Post.objects.all(), (FEED_VERSION,)), (35, False)
+        )
+
+    def test_sqlite_estimate_from_stat_table(self):
+        """SQLite оценивает таблицу по sqlite_stat1 после ANALYZE."""
+        if connection.vendor != 'sqlite':
+            self.skipTest('нужен SQLite')
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.assertEqual(estimate_count(Post.objects.all()), 35)
+        self.assertIsNone(estimate_count(self.user.posts.all()))
+
+    def test_page_links_on_index(self):
+        """Главная показывает окно номеров без лишних страниц."""
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertEqual(response.context['page_obj'].window, [1, 2, 3, 4])
+        self.assertContains(response, '?page=4')
+        self.assertNotContains(response, '?page=5')
@@ -0,0 +1,100 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+from .utils import QueryBudgetMixin
+
+
+class FeedQueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.FEED_QUERY_BUDGET = 5
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test_slug',
+            description='Тестовое описание',
+        )
+        for i in range(1, 13):
+            author = User.objects.create_user(
+                username=f'author_{i}',
+                first_name=f'Имя_{i}',
+                last_name=f'Фамилия_{i}',
+            )
+            Follow.objects.create(user=cls.reader, author=author)
+            post = Post.objects.create(
+                author=author,
+                text=f'{i}_Тестовый пост',
+                group=cls.group,
+            )
+            Comment.objects.create(post=post, author=cls.reader, text='Ок')
+        cls.author = author
+        for i in range(1, 10):
+            Post.objects.create(author=author, text=f'{i}_Ещё пост')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_feed_pages_fit_query_budget(self):
+        """Страницы лент укладываются в бюджет запросов без N+1."""
+        pages = (
+            (self.guest_client, reverse('posts:index')),
+            (self.guest_client, reverse(
+                'posts:group_list', kwargs={'slug': self.group.slug}
+            )),
+            (self.guest_client, reverse(
+                'posts:profile', kwargs={'username': self.author.username}
+            )),
+            (self.reader_client, reverse('posts:follow_index')),
+        )
+        for client, url in pages:
+            with self.subTest(url=url):
+                with self.assert_query_budget(self.FEED_QUERY_BUDGET):
+                    response = client.get(url)
+                self.assertEqual(len(response.context['page_obj']), 10)
+
+    def test_feed_annotates_comment_count(self):
+        """Карточки ленты получают число комментариев без доп. запросов."""
+        response = self.guest_client.get(reverse(
+            'posts:group_list', kwargs={'slug': self.group.slug}
+        ))
+        first_object = response.context['page_obj'][0]
+        self.assertEqual(first_object.comment_count, 1)
+        self.assertContains(response, 'Комментариев: 1')
+
+    def test_feed_counts_comments_without_group_by(self):
+        """Число комментариев считается подзапросом, а не GROUP BY
+        по всей ленте: иначе страница не берётся по индексу.
+        """
+        pages = (
+            (self.guest_client, reverse('posts:index')),
+            (self.guest_client, reverse(
+                'posts:group_list', kwargs={'slug': self.group.slug}
+            )),
+            (self.guest_client, reverse(
+                'posts:profile', kwargs={'username': self.author.username}
+            )),
+            (self.reader_client, reverse('posts:follow_index')),
+        )
+        for client, url in pages:
+            with self.subTest(url=url):
+                with self.assert_query_budget(
+                    self.FEED_QUERY_BUDGET
+                ) as context:
+                    client.get(url)
+                feed_queries = [
+                    query['sql'] for query in context.captured_queries
+                    if '"comment_count"' in query['sql']
+                ]
+                self.assertTrue(feed_queries)
+                for sql in feed_queries:
+                    self.assertNotIn('GROUP BY "posts_post"', sql)
+        plan = Post.objects.for_feed().order_by(
+            '-pub_date', '-pk'
+        )[:10].explain()
+        self.assertNotIn('GROUP BY', plan)
@@ -0,0 +1,74 @@
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Post, User
+from ..search import (SearchPaginator, SimpleSearchBackend,
+                      SqliteSearchBackend, get_backend)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.PAGE_VOLUME = 10
+        cls.user = User.objects.create_user(username='auth')
+        for i in range(1, 13):
+            Post.objects.create(author=cls.user, text=f'Котики номер {i}')
+        cls.dog_post = Post.objects.create(
+            author=cls.user, text='Собаки <b>тоже</b> хорошие'
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_sqlite_backend_is_used(self):
+        """На SQLite с FTS5 поиск идёт по виртуальной таблице."""
+        self.assertIsInstance(get_backend(), SqliteSearchBackend)
+
+    def test_search_results_are_paginated(self):
+        """Результаты поиска листаются курсорами без повторов."""
+        for backend in (get_backend(), SimpleSearchBackend()):
+            with self.subTest(backend=type(backend).__name__):
+                first_page = SearchPaginator(
+                    'номер', self.PAGE_VOLUME, backend=backend
+                ).get_page()
+                second_page = SearchPaginator(
+                    'номер', self.PAGE_VOLUME, backend=backend
+                ).get_page(cursor=first_page.next_cursor)
+                self.assertEqual(len(first_page), self.PAGE_VOLUME)
+                self.assertEqual(len(second_page), 2)
+                self.assertFalse(set(first_page) & set(second_page))
+
+    def test_search_view_highlights_snippet(self):
+        """Страница поиска подсвечивает найденное и экранирует текст."""
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': 'собаки'}
+        )
+        self.assertEqual(list(response.context['page_obj']), [self.dog_post])
+        self.assertContains(response, '<mark>Собаки</mark>')
+        self.assertContains(response, '&lt;b&gt;тоже&lt;/b&gt;')
+
+    def test_index_follows_edit_and_delete(self):
+        """Индекс обновляется при редактировании и удалении поста."""
+        post = Post.objects.get(pk=self.dog_post.pk)
+        post.text = 'Попугаи'
+        post.save()
+        self.assertFalse(SearchPaginator('собаки', 10).get_page())
+        self.assertTrue(SearchPaginator('попугаи', 10).get_page())
+        post.delete()
+        self.assertFalse(SearchPaginator('попугаи', 10).get_page())
+
+    def test_search_ignores_control_characters(self):
+        """Управляющие символы в запросе не ломают поиск и подсветку."""
+        for query in ('\x00', 'соб\x00аки', '\x02собаки\x03'):
+            with self.subTest(query=query):
+                response = self.guest_client.get(
+                    reverse('posts:search'), {'q': query}
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertNotContains(response, '<mark></mark>')
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': '\x02собаки\x03'}
+        )
+        self.assertEqual(response.context['query'], 'собаки')
+        self.assertEqual(list(response.context['page_obj']), [self.dog_post])
@@ -0,0 +1,110 @@
+import shutil
+import tempfile
+from datetime import datetime
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ..models import Comment, Follow, MediaFile, Post, TimelineEntry, User
+from ..paginator import NEXT
+from ..search import get_backend
+from ..seeding import (Plan, generate, generate_posts, generator_pool,
+                       seed_yatube)
+from ..stats import recount_stats
+from ..threads import subtree
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+UNTIL = timezone.make_aware(datetime(2026, 1, 1))
+VOLUMES = {
+    'users': 30, 'groups': 3, 'posts': 120, 'comments': 200, 'follows': 60,
+}
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SeedYatubeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.created = seed_yatube(
+            VOLUMES, seed=7, batch_size=50, image_share=0.5, until=UNTIL,
+            days=30
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_volumes_created(self):
+        """Создаётся заданное число объектов каждого вида."""
+        self.assertEqual(self.created, VOLUMES)
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 120)
+        self.assertEqual(Comment.objects.count(), 200)
+        self.assertEqual(Follow.objects.count(), 60)
+
+    def test_dates_spread_over_period(self):
+        """Даты постов и комментариев разные и лежат в периоде."""
+        dates = list(Post.objects.values_list('pub_date', flat=True))
+        self.assertGreater(len(set(dates)), 1)
+        self.assertLessEqual(max(dates), UNTIL)
+        for comment in Comment.objects.select_related('post'):
+            self.assertGreaterEqual(comment.created, comment.post.pub_date)
+
+    def test_derived_tables_filled(self):
+        """Счётчики, ленты, ветки, поиск и ссылки на картинки заполнены."""
+        self.assertEqual(recount_stats(), 0)
+        follow = Follow.objects.first()
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=follow.user_id).count(),
+            Post.objects.filter(
+                author__following__user=follow.user_id
+            ).count()
+        )
+        post = Post.objects.first()
+        word = post.text.split()[0].strip('.,')
+        found = [pk for pk, _ in get_backend().ranked_ids(
+            word, NEXT, None, Post.objects.count()
+        )]
+        self.assertIn(post.pk, found)
+        self.assertTrue(Comment.objects.exclude(parent=None).exists())
+        for comment in Comment.objects.filter(replies_count__gt=0):
+            self.assertEqual(
+                comment.replies_count, subtree(comment).count()
+            )
+        self.assertTrue(Post.objects.exclude(image='').exists())
+        for media_file in MediaFile.objects.all():
+            self.assertEqual(
+                media_file.refs,
+                Post.objects.filter(image=media_file.name).count()
+            )
+
+    def test_seeding_again_appends(self):
+        """Повторный запуск добавляет данные после существующих."""
+        seed_yatube(VOLUMES, seed=7, batch_size=50, until=UNTIL, days=30)
+        self.assertEqual(User.objects.count(), 60)
+        self.assertEqual(Post.objects.count(), 240)
+        self.assertEqual(recount_stats(), 0)
+
+
+class GeneratorTests(TestCase):
+    plan = Plan(
+        seed=1, first_user=1, first_group=1, first_post=1, first_comment=1,
+        until=UNTIL, days=10, batch_size=20, password='!', **VOLUMES
+    )
+
+    def test_chunks_are_deterministic(self):
+        """Пачка зависит только от плана и номера."""
+        self.assertEqual(
+            generate_posts(self.plan, 2), generate_posts(self.plan, 2)
+        )
+        self.assertNotEqual(
+            generate_posts(self.plan, 2), generate_posts(self.plan, 3)
+        )
+
+    def test_workers_produce_same_rows(self):
+        """Пул процессов генерирует те же строки, что и один процесс."""
+        tasks = [('posts', self.plan, index) for index in range(6)]
+        expected = [generate(task) for task in tasks]
+        with generator_pool(2) as pool_map:
+            self.assertEqual(list(pool_map(generate, tasks)), expected)
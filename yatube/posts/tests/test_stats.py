@@ -0,0 +1,75 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Post, User, UserStats
+
+
+class UserStatsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def get_stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются вместе с постами, комментариями и подписками."""
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        self.reader_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+            data={'text': 'Комментарий'}
+        )
+        self.reader_client.get(reverse(
+            'posts:profile_follow',
+            kwargs={'username': self.author.username}
+        ))
+        author_stats = self.get_stats(self.author)
+        reader_stats = self.get_stats(self.reader)
+        self.assertEqual(author_stats.posts_count, 1)
+        self.assertEqual(author_stats.followers_count, 1)
+        self.assertEqual(reader_stats.following_count, 1)
+        self.assertEqual(reader_stats.comments_count, 1)
+
+        self.reader_client.get(reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': self.author.username}
+        ))
+        post.delete()
+        author_stats = self.get_stats(self.author)
+        reader_stats = self.get_stats(self.reader)
+        self.assertEqual(author_stats.posts_count, 0)
+        self.assertEqual(author_stats.followers_count, 0)
+        self.assertEqual(reader_stats.following_count, 0)
+        self.assertEqual(reader_stats.comments_count, 0)
+
+    def test_recount_command_fixes_drift(self):
+        """Команда recount_stats исправляет разошедшиеся счётчики."""
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        Comment.objects.create(post=post, author=self.reader, text='Ок')
+        Follow.objects.create(user=self.reader, author=self.author)
+        UserStats.objects.filter(user=self.author).update(posts_count=42)
+        UserStats.objects.filter(user=self.reader).delete()
+        out = StringIO()
+        call_command('recount_stats', stdout=out)
+        self.assertIn('2', out.getvalue())
+        self.assertEqual(self.get_stats(self.author).posts_count, 1)
+        self.assertEqual(self.get_stats(self.reader).comments_count, 1)
+        self.assertEqual(self.get_stats(self.reader).following_count, 1)
+
+    def test_profile_shows_counters_without_count_query(self):
+        """Профиль выводит число постов из счётчиков."""
+        Post.objects.create(author=self.author, text='Тестовый пост')
+        response = self.reader_client.get(reverse(
+            'posts:profile', kwargs={'username': self.author.username}
+        ))
+        self.assertEqual(response.context['count'], 1)
+        self.assertEqual(response.context['stats'].followers_count, 0)
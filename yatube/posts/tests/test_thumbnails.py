@@ -0,0 +1,98 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import thumbnails
+from ..models import Post, User
+from ..templatetags.post_cards import card_key
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def create_post(self, name):
+        return Post.objects.create(
+            author=self.user,
+            text='Тестовый пост',
+            image=SimpleUploadedFile(
+                name=name, content=SMALL_GIF, content_type='image/gif'
+            )
+        )
+
+    def test_feed_shows_placeholder_until_thumbnail_ready(self):
+        """Пока миниатюра не готова, лента выводит заглушку
+        и не кэширует карточку.
+        """
+        with patch.object(thumbnails, '_get_workers', return_value=2):
+            post = self.create_post('pending.gif')
+            response = self.guest_client.get(reverse('posts:index'))
+        self.assertIsNone(thumbnails.get_picture(post.image))
+        self.assertContains(response, 'thumbnail-pending')
+        feed_post = Post.objects.for_feed().get(pk=post.pk)
+        self.assertIsNone(cache.get(card_key(feed_post, True)))
+
+    def test_thumbnails_generated_on_save(self):
+        """Все варианты картинки создаются при сохранении поста."""
+        post = self.create_post('ready.gif')
+        for width, format_ in thumbnails.get_variants():
+            geometry, options = thumbnails.variant_geometry(width, format_)
+            with self.subTest(width=width, format=format_):
+                self.assertIsNotNone(
+                    thumbnails.backend.get_ready_thumbnail(
+                        post.image, geometry, **options
+                    )
+                )
+        picture = thumbnails.get_picture(post.image)
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, picture['src'])
+        self.assertNotContains(response, 'thumbnail-pending')
+
+    def test_feed_renders_srcset(self):
+        """Лента выводит srcset со всеми ширинами и атрибут sizes."""
+        post = self.create_post('srcset.gif')
+        picture = thumbnails.get_picture(post.image)
+        response = self.guest_client.get(reverse('posts:index'))
+        for width in thumbnails.VARIANT_WIDTHS:
+            with self.subTest(width=width):
+                self.assertIn(f' {width}w', picture['srcset'])
+        self.assertContains(response, f'srcset="{picture["srcset"]}"')
+        self.assertContains(response, thumbnails.IMAGE_SIZES)
+
+    def test_image_bytes_command(self):
+        """Команда image_bytes сравнивает объём страницы до и после."""
+        self.create_post('bytes.gif')
+        out = StringIO()
+        call_command('image_bytes', stdout=out)
+        self.assertIn('до:', out.getvalue())
+        self.assertIn('телефон 360px x3: 1920w', out.getvalue())
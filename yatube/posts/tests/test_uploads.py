@@ -0,0 +1,212 @@
+import os
+import shutil
+import struct
+import tempfile
+import tracemalloc
+import zlib
+from io import BytesIO
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image, ImageFile
+
+from .. import uploads
+from ..forms import PostForm
+from ..models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+MEGABYTE: int = 1024 * 1024
+
+
+def make_jpeg(size, exif=None):
+    buffer = BytesIO()
+    options = {'exif': exif.tobytes()} if exif is not None else {}
+    Image.new('RGB', size, (200, 80, 40)).save(buffer, 'JPEG', **options)
+    return buffer.getvalue()
+
+
+def png_chunk(kind, data):
+    body = kind + data
+    return (
+        struct.pack('>I', len(data)) + body
+        + struct.pack('>I', zlib.crc32(body))
+    )
+
+
+def make_png_header(width, height):
+    """PNG с заголовком на width x height и почти без пикселей."""
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0,
+                                         0, 0))
+        + png_chunk(b'IDAT', zlib.compress(b'\x00'))
+        + png_chunk(b'IEND', b'')
+    )
+
+
+class UploadValidationTests(TestCase):
+    def test_oversize_dimensions_rejected_from_header(self):
+        """Картинка больше MAX_IMAGE_PIXELS отклоняется
+        без декодирования пикселей.
+        """
+        upload = SimpleUploadedFile('huge.png', make_png_header(8000, 8000))
+        with patch.object(ImageFile.ImageFile, 'load') as load:
+            with self.assertRaises(ValidationError) as error:
+                uploads.check_image(upload)
+        load.assert_not_called()
+        self.assertEqual(error.exception.code, 'image_too_large')
+
+    def test_form_rejects_oversize_dimensions(self):
+        """Форма поста выводит ошибку для слишком большой картинки."""
+        form = PostForm(
+            data={'text': 'Пост'},
+            files={'image': SimpleUploadedFile(
+                'huge.png', make_png_header(8000, 8000)
+            )}
+        )
+        self.assertFalse(form.is_valid())
+        self.assertEqual(
+            form.errors.as_data()['image'][0].code, 'image_too_large'
+        )
+
+    def test_reencode_strips_exif_and_applies_orientation(self):
+        """Пережатая картинка повёрнута по EXIF и не содержит EXIF."""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010F] = 'Camera'
+        upload = SimpleUploadedFile('photo.jpeg', make_jpeg((40, 20), exif))
+        result = uploads.reencode_image(upload)
+        self.assertEqual(result.name, 'photo.jpg')
+        with Image.open(result) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (20, 40))
+            self.assertNotIn('exif', image.info)
+
+    def test_transparent_image_kept_as_png(self):
+        """Картинка с прозрачностью пережимается в PNG."""
+        buffer = BytesIO()
+        Image.new('RGBA', (10, 10), (0, 0, 0, 0)).save(buffer, 'PNG')
+        result = uploads.reencode_image(
+            SimpleUploadedFile('clear.png', buffer.getvalue())
+        )
+        self.assertEqual(result.content_type, 'image/png')
+        self.assertEqual(result.name, 'clear.png')
+
+
+class UploadMemoryTests(TestCase):
+    def stream(self, handler, total):
+        chunk = b'\x00' * handler.chunk_size
+        handler.new_file('image', 'big.jpg', 'image/jpeg', None)
+        for start in range(0, total, len(chunk)):
+            handler.receive_data_chunk(chunk, start)
+        return handler.file_complete(total)
+
+    def test_handler_streams_to_disk(self):
+        """Загрузка в 8 МБ пишется на диск кусками по chunk_size."""
+        handler = uploads.ImageUploadHandler()
+        tracemalloc.start()
+        upload = self.stream(handler, 8 * MEGABYTE)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.assertLess(peak, MEGABYTE)
+        self.assertEqual(
+            os.path.getsize(upload.temporary_file_path()), 8 * MEGABYTE
+        )
+        upload.close()
+
+    def test_handler_drops_bytes_over_limit(self):
+        """Данные сверх MAX_IMAGE_BYTES не пишутся, а файл отклоняется."""
+        handler = uploads.ImageUploadHandler()
+        with patch.object(uploads, 'MAX_IMAGE_BYTES', MEGABYTE):
+            upload = self.stream(handler, 2 * MEGABYTE)
+            self.assertEqual(upload.size, 2 * MEGABYTE)
+            self.assertEqual(
+                os.path.getsize(upload.temporary_file_path()), MEGABYTE
+            )
+            with self.assertRaises(ValidationError) as error:
+                uploads.check_image(upload)
+        self.assertEqual(error.exception.code, 'file_too_large')
+        upload.close()
+
+    def test_large_jpeg_decoded_at_reduced_scale(self):
+        """24-мегапиксельный JPEG декодируется в четверть пикселей."""
+        upload = SimpleUploadedFile('big.jpg', make_jpeg((6000, 4000)))
+        with uploads.open_draft(upload) as image:
+            image.load()
+            self.assertEqual(image.size, (3000, 2000))
+
+    def test_reencode_large_jpeg_bounded(self):
+        """Пережатие 24-мегапиксельного JPEG не копирует файл
+        в память Python и ограничивает размер результата.
+        """
+        upload = SimpleUploadedFile('big.jpg', make_jpeg((6000, 4000)))
+        tracemalloc.start()
+        result = uploads.reencode_image(upload)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.assertLess(peak, 2 * MEGABYTE)
+        with Image.open(result) as image:
+            self.assertEqual(max(image.size), uploads.MAX_STORED_SIDE)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class UploadViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_create_stores_reencoded_image(self):
+        """Новый пост сохраняет пережатую картинку без EXIF."""
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        self.authorized_client.post(reverse('posts:post_create'), data={
+            'text': 'Пост с фото',
+            'image': SimpleUploadedFile(
+                'photo.jpg', make_jpeg((30, 30), exif), 'image/jpeg'
+            ),
+        })
+        post = Post.objects.get(text='Пост с фото')
+        self.assertRegex(
+            post.image.name, r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$'
+        )
+        with Image.open(post.image.path) as image:
+            self.assertNotIn('exif', image.info)
+
+    def test_create_rejects_oversize_file(self):
+        """Слишком большой файл не сохраняется, форма выводит ошибку."""
+        with patch.object(uploads, 'MAX_IMAGE_BYTES', 100):
+            response = self.authorized_client.post(
+                reverse('posts:post_create'),
+                data={
+                    'text': 'Большой файл',
+                    'image': SimpleUploadedFile(
+                        'big.jpg', make_jpeg((30, 30)), 'image/jpeg'
+                    ),
+                }
+            )
+        self.assertTrue(response.context['form'].errors['image'])
+        self.assertFalse(Post.objects.filter(text='Большой файл').exists())
+
+    def test_create_keeps_csrf_protection(self):
+        """Замена обработчиков загрузки не отключает проверку CSRF."""
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        response = client.post(
+            reverse('posts:post_create'), data={'text': 'Без токена'}
+        )
+        self.assertTemplateUsed(response, 'core/403csrf.html')
+        self.assertFalse(Post.objects.filter(text='Без токена').exists())
@@ -42,6 +42,10 @@ class PostsPagesTests(TestCase):
             b'\x02\x00\x01\x00\x00\x02\x02\x0C'
             b'\x0A\x00\x3B'
         )
+        # Одинаковые картинки хранятся в одном файле с именем по хешу.
+        cls.image_name = Post._meta.get_field('image').storage.content_name(
+            'posts/small.gif', SimpleUploadedFile('small.gif', small_gif)
+        )
         for i in range(1, 16):
             uploaded = SimpleUploadedFile(
                 name=f'small_{i}.gif',
@@ -146,7 +150,7 @@ class PostsPagesTests(TestCase):
         )
         self.assertEqual(
             response.context['selected_post'].image.name,
-            f'posts/small_{self.SAMPLE_POST_ID}.gif'
+            self.image_name
         )
 
     def test_profile_page_show_correct_context(self):
@@ -162,7 +166,7 @@ class PostsPagesTests(TestCase):
         )
         self.assertEqual(str(first_object.author), self.test_user.username)
         self.assertEqual(str(first_object.group), self.main_group.title)
-        self.assertEqual(first_object.image.name, 'posts/small_15.gif')
+        self.assertEqual(first_object.image.name, self.image_name)
 
     def test_profile_first_page_paginator(self):
         """Корректная работа паджинатора на 1-й странице profile."""
@@ -199,7 +203,7 @@ class PostsPagesTests(TestCase):
         )
         self.assertEqual(str(first_object.author), self.test_user.username)
         self.assertEqual(str(first_object.group), self.main_group.title)
-        self.assertEqual(first_object.image.name, 'posts/small_15.gif')
+        self.assertEqual(first_object.image.name, self.image_name)
 
     def test_group_list_first_page_paginator(self):
         """Корректная работа паджинатора на 1-й странице group_list."""
@@ -233,7 +237,7 @@ class PostsPagesTests(TestCase):
         )
         self.assertEqual(str(first_object.author), self.test_user.username)
         self.assertEqual(str(first_object.group), self.main_group.title)
-        self.assertEqual(first_object.image.name, 'posts/small_15.gif')
+        self.assertEqual(first_object.image.name, self.image_name)
 
     def test_index_first_page_paginator(self):
         """Корректная работа паджинатора на 1-й странице index."""
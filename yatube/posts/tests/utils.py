@@ -0,0 +1,25 @@
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """Проверка, что код укладывается в заданное число SQL-запросов."""
+
+    @contextmanager
+    def assert_query_budget(self, budget, using=DEFAULT_DB_ALIAS):
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+        executed = len(context.captured_queries)
+        if executed > budget:
+            queries = '\n'.join(
+                f'{number}. {query["sql"]}'
+                for number, query in enumerate(
+                    context.captured_queries, start=1
+                )
+            )
+            self.fail(
+                f'Выполнено {executed} запросов при бюджете {budget}:\n'
+                f'{queries}'
+            )
@@ -0,0 +1,66 @@
+from django.db import connection
+from django.db.models import F
+
+from .models import PATH_END, PATH_SEGMENT, Comment
+
+FIRST_REPLIES: int = 3
+
+
+def lineage(path):
+    """Пути комментария и всех его предков от корня ветки."""
+    return [
+        path[:end]
+        for end in range(PATH_SEGMENT, len(path) + 1, PATH_SEGMENT)
+    ]
+
+
+def change_replies_count(paths, delta):
+    """Атомарно сдвигает число ответов комментариев на delta."""
+    Comment.objects.filter(path__in=paths).update(
+        replies_count=F('replies_count') + delta
+    )
+
+
+def subtree(comment, after=None):
+    """Ответы в поддереве comment в порядке дерева одним запросом;
+    after — путь последнего уже показанного ответа.
+    """
+    return Comment.objects.filter(
+        path__gt=max(after or '', comment.path),
+        path__lt=comment.path + PATH_END
+    ).select_related('author').order_by('path')
+
+
+def _first_reply_ids(roots, limit):
+    table = Comment._meta.db_table
+    ranges = ' OR '.join(['(path > %s AND path < %s)'] * len(roots))
+    params = []
+    for root in roots:
+        params += [root.path, root.path + PATH_END]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT id FROM (SELECT id, ROW_NUMBER() OVER ('
+            f'PARTITION BY substr(path, 1, {PATH_SEGMENT}) ORDER BY path'
+            f') AS position FROM {table} WHERE {ranges}) ranked '
+            f'WHERE position <= %s',
+            params + [limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def attach_first_replies(roots, limit=FIRST_REPLIES):
+    """Добавляет веткам first_replies — первые limit ответов в
+    порядке дерева. Число запросов не зависит от числа веток.
+    """
+    threads = {root.path: [] for root in roots if root.replies_count}
+    if threads:
+        replies = Comment.objects.filter(
+            pk__in=_first_reply_ids(
+                [root for root in roots if root.path in threads], limit
+            )
+        ).select_related('author').order_by('path')
+        for reply in replies:
+            threads[reply.path[:PATH_SEGMENT]].append(reply)
+    for root in roots:
+        root.first_replies = threads.get(root.path, [])
+    return roots
@@ -0,0 +1,199 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection, transaction
+from PIL import features
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from .cache import bump_post_feeds
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Картинки постов выводятся с пропорциями 960x339 в нескольких
+# ширинах; браузер выбирает вариант по srcset и sizes.
+ASPECT_RATIO = (960, 339)
+VARIANT_WIDTHS = (320, 640, 960, 1920)
+FALLBACK_WIDTH: int = 960
+# Форматы в порядке предпочтения; JPEG понимают все браузеры.
+VARIANT_FORMATS = ('WEBP', 'JPEG')
+FALLBACK_FORMAT: str = 'JPEG'
+FORMAT_OPTIONS = {
+    'WEBP': {'quality': 80},
+    'JPEG': {},
+}
+MIME_TYPES = {
+    'WEBP': 'image/webp',
+    'JPEG': 'image/jpeg',
+}
+# Ширина слота картинки: колонка 960px на широких экранах.
+IMAGE_SIZES: str = '(min-width: 992px) 960px, 100vw'
+THUMBNAIL_WORKERS: int = 2
+
+
+class PregeneratedThumbnailBackend(ThumbnailBackend):
+    def normalize_options(self, source, options):
+        """Дополняет опции так же, как ThumbnailBackend.get_thumbnail."""
+        options = dict(options)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        return options
+
+    def get_ready_thumbnail(self, file_, geometry_string, **options):
+        """Возвращает готовую миниатюру или None, ничего не генерируя."""
+        source = ImageFile(file_)
+        options = self.normalize_options(source, options)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+    def get_thumbnail_url(self, file_, geometry_string, **options):
+        """Адрес миниатюры по детерминированному имени без kvstore."""
+        source = ImageFile(file_)
+        options = self.normalize_options(source, options)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage).url
+
+
+backend = PregeneratedThumbnailBackend()
+
+
+@lru_cache(maxsize=None)
+def get_formats():
+    """Форматы вариантов, которые умеет кодировать Pillow."""
+    return tuple(
+        format_ for format_ in VARIANT_FORMATS
+        if format_ != 'WEBP' or features.check('webp')
+    )
+
+
+def get_variants():
+    """Пары (ширина, формат) в порядке генерации.
+
+    Запасной вариант совпадает с прежней миниатюрой и идёт первым,
+    а последний вариант готов только после всех остальных, поэтому
+    шаблону хватает одной проверки.
+    """
+    fallback = (FALLBACK_WIDTH, FALLBACK_FORMAT)
+    return [fallback] + [
+        (width, format_)
+        for format_ in get_formats() for width in VARIANT_WIDTHS
+        if (width, format_) != fallback
+    ]
+
+
+def variant_geometry(width, format_):
+    """Геометрия и опции sorl для варианта."""
+    width_ratio, height_ratio = ASPECT_RATIO
+    height = round(width * height_ratio / width_ratio)
+    options = {'crop': 'center', 'upscale': True, 'format': format_}
+    options.update(FORMAT_OPTIONS[format_])
+    return f'{width}x{height}', options
+
+
+def get_srcset(image, format_):
+    urls = []
+    for width in VARIANT_WIDTHS:
+        geometry, options = variant_geometry(width, format_)
+        url = backend.get_thumbnail_url(image, geometry, **options)
+        urls.append(f'{url} {width}w')
+    return ', '.join(urls)
+
+
+def is_ready(image):
+    """Созданы ли все варианты картинки."""
+    geometry, options = variant_geometry(*get_variants()[-1])
+    return backend.get_ready_thumbnail(image, geometry, **options) is not None
+
+
+def get_picture(image):
+    """Источники для <picture> или None, если варианты не готовы."""
+    if not is_ready(image):
+        return None
+    geometry, options = variant_geometry(FALLBACK_WIDTH, FALLBACK_FORMAT)
+    width, height = geometry.split('x')
+    return {
+        'sources': [
+            {'type': MIME_TYPES[format_], 'srcset': get_srcset(image, format_)}
+            for format_ in get_formats() if format_ != FALLBACK_FORMAT
+        ],
+        'src': backend.get_thumbnail_url(image, geometry, **options),
+        'srcset': get_srcset(image, FALLBACK_FORMAT),
+        'sizes': IMAGE_SIZES,
+        'width': width,
+        'height': height,
+    }
+
+
+_pending = set()
+_lock = threading.Lock()
+
+
+def _get_workers():
+    # Потоки пула открывают свои соединения, а in-memory база
+    # SQLite (например, тестовая) не выдерживает параллельной записи.
+    if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+        return 0
+    return getattr(settings, 'POSTS_THUMBNAIL_WORKERS', THUMBNAIL_WORKERS)
+
+
+@lru_cache(maxsize=None)
+def _get_executor():
+    return ThreadPoolExecutor(
+        max_workers=_get_workers(),
+        thread_name_prefix='thumbnails'
+    )
+
+
+def generate(post_id, image_name):
+    """Создаёт все варианты картинки и обновляет кэш лент."""
+    source = ImageFile(image_name, Post._meta.get_field('image').storage)
+    for width, format_ in get_variants():
+        geometry, options = variant_geometry(width, format_)
+        backend.get_thumbnail(source, geometry, **options)
+    post = Post.objects.filter(pk=post_id).first()
+    if post is not None:
+        bump_post_feeds(post)
+
+
+def _run(post_id, image_name):
+    try:
+        generate(post_id, image_name)
+    except Exception:
+        logger.exception('Thumbnails for %s failed', image_name)
+    finally:
+        with _lock:
+            _pending.discard(image_name)
+        connection.close()
+
+
+def enqueue(post_id, image_name):
+    """Ставит генерацию миниатюр в очередь пула, повторы отбрасываются."""
+    with _lock:
+        if image_name in _pending:
+            return
+        _pending.add(image_name)
+    _get_executor().submit(_run, post_id, image_name)
+
+
+def schedule(post_id, image_name):
+    """Запускает генерацию после фиксации текущей транзакции.
+
+    При POSTS_THUMBNAIL_WORKERS = 0 миниатюры создаются сразу.
+    """
+    if not _get_workers():
+        generate(post_id, image_name)
+        return
+    transaction.on_commit(lambda: enqueue(post_id, image_name))
@@ -0,0 +1,150 @@
+from django.db import connection
+from django.db.models import Q
+
+from .models import Follow, Post, TimelineEntry, UserStats
+from .paginator import NEXT, KeysetPaginator
+from .stats import get_stats
+
+# Посты авторов с большим числом подписчиков не раскладываются
+# по лентам при записи, а подмешиваются в ленту при чтении.
+FANOUT_FOLLOWERS_LIMIT: int = 1000
+FANOUT_BATCH_SIZE: int = 500
+
+
+def is_fanout_author(author):
+    return get_stats(author).followers_count <= FANOUT_FOLLOWERS_LIMIT
+
+
+def fan_out_post(post):
+    """Добавляет новый пост в ленты подписчиков автора."""
+    if not is_fanout_author(post.author):
+        return
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in post.author.following.values_list(
+                'user_id', flat=True
+            ).iterator()
+        ),
+        batch_size=FANOUT_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def add_author_posts(user, author):
+    """Заполняет ленту читателя постами автора после подписки."""
+    if not is_fanout_author(author):
+        return
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user=user, post_id=pk, pub_date=pub_date)
+            for pk, pub_date in author.posts.values_list(
+                'pk', 'pub_date'
+            ).iterator()
+        ),
+        batch_size=FANOUT_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def _insert_entries(where, params):
+    # Записи, которые уже есть в лентах, пропускаются.
+    ops = connection.ops
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{ops.insert_statement(ignore_conflicts=True)} '
+            f'{TimelineEntry._meta.db_table} (user_id, post_id, pub_date) '
+            f'SELECT follow.user_id, post.id, post.pub_date '
+            f'FROM {Post._meta.db_table} post '
+            f'JOIN {Follow._meta.db_table} follow '
+            f'ON follow.author_id = post.author_id '
+            f'JOIN {UserStats._meta.db_table} stats '
+            f'ON stats.user_id = post.author_id '
+            f'WHERE {where} '
+            f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}',
+            params
+        )
+        return cursor.rowcount
+
+
+def fill_timelines(first_post_id):
+    """Раскладывает по лентам посты с pk от first_post_id, созданные
+    через bulk_create в обход сигналов. Счётчики подписчиков должны
+    быть уже пересчитаны.
+    """
+    return _insert_entries(
+        'post.id >= %s AND stats.followers_count <= %s',
+        [first_post_id, FANOUT_FOLLOWERS_LIMIT]
+    )
+
+
+def backfill_author(author_id):
+    """Раскладывает все посты автора по лентам его подписчиков.
+
+    Пока автор был сверх лимита, его посты читались напрямую и в ленты
+    не попадали; после возврата под лимит они иначе пропали бы.
+    """
+    return _insert_entries('post.author_id = %s', [author_id])
+
+
+def rebalance_author(author_id):
+    """Обработчик смены числа подписчиков: при возврате автора под
+    лимит его посты раскладываются по лентам заново.
+    """
+    followers_count = UserStats.objects.filter(
+        user_id=author_id
+    ).values_list('followers_count', flat=True).first()
+    if followers_count == FANOUT_FOLLOWERS_LIMIT:
+        backfill_author(author_id)
+
+
+def remove_author_posts(user, author):
+    """Убирает посты автора из ленты читателя после отписки."""
+    TimelineEntry.objects.filter(user=user, post__author=author).delete()
+
+
+def read_time_authors(user):
+    """Авторы из подписок читателя, чьи посты читаются напрямую."""
+    return UserStats.objects.filter(
+        user__in=user.follower.values('author'),
+        followers_count__gt=FANOUT_FOLLOWERS_LIMIT
+    ).values('user')
+
+
+class FollowFeedPaginator(KeysetPaginator):
+    """Лента подписок по ключу (pub_date, post_id) записей ленты.
+
+    Страница — диапазон индекса (user, -pub_date, -post) записей
+    читателя и такой же диапазон постов популярных авторов по индексу
+    (author, -pub_date, -id). Оба диапазона с LIMIT подставляются
+    подзапросами в один запрос карточек и сливаются по ключу.
+    """
+
+    def __init__(self, user, per_page, **kwargs):
+        self.entries = TimelineEntry.objects.filter(user=user)
+        self.read_time_posts = Post.objects.filter(
+            author__in=read_time_authors(user)
+        )
+        # Весь набор нужен ссылкам ?page=N и подсчёту числа постов.
+        feed = Post.objects.filter(
+            Q(pk__in=self.entries.values('post_id'))
+            | Q(pk__in=self.read_time_posts.values('pk'))
+        )
+        super().__init__(feed.for_feed(), per_page, count_list=feed, **kwargs)
+
+    def fetch(self, direction, position, limit):
+        entries = self.seek(
+            self.entries, direction, position, pk_field='post_id'
+        ).values('post_id')[:limit]
+        posts = self.seek(
+            self.read_time_posts, direction, position
+        ).values('pk')[:limit]
+        # Пост мог попасть в оба диапазона, пока автор пересекал лимит.
+        rows = Post.objects.for_feed().filter(
+            Q(pk__in=entries) | Q(pk__in=posts)
+        ).order_by()
+        ascending = (direction == NEXT) == self.ascending
+        return sorted(
+            rows, key=lambda post: (post.pub_date, post.pk),
+            reverse=not ascending
+        )[:limit]
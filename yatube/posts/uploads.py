@@ -0,0 +1,137 @@
+import os
+import tempfile
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image, ImageOps
+
+MAX_IMAGE_BYTES: int = 20 * 1024 * 1024
+MAX_IMAGE_PIXELS: int = 40_000_000
+ALLOWED_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+# Оригинал хранится не больше самого широкого варианта с запасом.
+MAX_STORED_SIDE: int = 2560
+JPEG_QUALITY: int = 90
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузку во временный файл, не держа её в памяти.
+
+    Данные сверх MAX_IMAGE_BYTES не записываются, а размер файла
+    остаётся полным, чтобы форма могла отклонить загрузку.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received <= MAX_IMAGE_BYTES:
+            self.file.write(raw_data)
+
+
+def stream_image_uploads(view):
+    """Подключает ImageUploadHandler к view с формой PostForm.
+
+    Обработчики нужно заменить до чтения request.POST, которое
+    делает CsrfViewMiddleware, поэтому CSRF проверяется внутри.
+    """
+    protected_view = csrf_protect(view)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers = [ImageUploadHandler(request)]
+        return protected_view(request, *args, **kwargs)
+    return wrapper
+
+
+def open_image(file):
+    """Открывает картинку, читая только заголовок."""
+    if hasattr(file, 'temporary_file_path'):
+        return Image.open(file.temporary_file_path())
+    file.seek(0)
+    return Image.open(file)
+
+
+def check_image(file):
+    """Проверяет объём, формат и число пикселей до декодирования."""
+    if file.size > MAX_IMAGE_BYTES:
+        raise ValidationError(
+            'Файл больше %(limit)d МБ.',
+            code='file_too_large',
+            params={'limit': MAX_IMAGE_BYTES // (1024 * 1024)}
+        )
+    try:
+        image = open_image(file)
+    except Exception:
+        raise ValidationError(
+            'Загрузите правильное изображение.', code='invalid_image'
+        )
+    with image:
+        if image.format not in ALLOWED_FORMATS:
+            raise ValidationError(
+                'Поддерживаются форматы %(formats)s.',
+                code='invalid_format',
+                params={'formats': ', '.join(ALLOWED_FORMATS)}
+            )
+        width, height = image.size
+    if width * height > MAX_IMAGE_PIXELS:
+        raise ValidationError(
+            'Картинка больше %(limit)d мегапикселей.',
+            code='image_too_large',
+            params={'limit': MAX_IMAGE_PIXELS // 1_000_000}
+        )
+
+
+def open_draft(file):
+    """Открывает картинку для пережатия в уменьшенном масштабе.
+
+    JPEG декодируется сразу с уменьшением в 2, 4 или 8 раз,
+    если картинка всё равно больше MAX_STORED_SIDE.
+    """
+    image = open_image(file)
+    scale = MAX_STORED_SIDE / max(image.size)
+    if scale < 1:
+        image.draft('RGB', (
+            round(image.width * scale), round(image.height * scale)
+        ))
+    return image
+
+
+def reencode_image(file):
+    """Пережимает картинку не больше MAX_STORED_SIDE без EXIF.
+
+    Поворот из EXIF применяется к пикселям, прозрачные картинки
+    сохраняются в PNG, остальные — в JPEG. Результат держится
+    в памяти, пока не превышает FILE_UPLOAD_MAX_MEMORY_SIZE.
+    """
+    with open_draft(file) as source:
+        image = ImageOps.exif_transpose(source)
+        image.thumbnail((MAX_STORED_SIDE, MAX_STORED_SIDE))
+        if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+            image = image.convert('RGBA')
+            format_, extension, options = 'PNG', 'png', {'optimize': True}
+        else:
+            image = image.convert('RGB')
+            format_, extension, options = 'JPEG', 'jpg', {
+                'quality': JPEG_QUALITY, 'progressive': True
+            }
+        # PNG иначе сохранит EXIF из image.info.
+        image.info.clear()
+        buffer = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        image.save(buffer, format_, **options)
+    size = buffer.tell()
+    buffer.seek(0)
+    return UploadedFile(
+        buffer,
+        name=f'{os.path.splitext(file.name)[0]}.{extension}',
+        content_type=Image.MIME[format_],
+        size=size
+    )
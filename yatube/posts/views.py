@@ -1,32 +1,76 @@
+from core.replicas import pin_primary, replica_reads
+from core.throttling import throttle
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import transaction
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
 
+from .cache import (AUTHOR_VERSION, FEED_VERSION, GROUP_VERSION, POST_VERSION,
+                    cache_feed, conditional_page, viewer_version)
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
+from .models import Comment, Follow, Group, Post, User
+from .paginator import CommentPaginator, KeysetPaginator
+from .search import SearchPaginator, clean_query
+from .stats import get_stats
+from .threads import attach_first_replies, subtree
+from .timeline import FollowFeedPaginator
+from .uploads import stream_image_uploads
 
 LIST_VOLUME: int = 10
-CACHE_DELAY_SECONDS: float = 20
+COMMENTS_VOLUME: int = 20
+NEWEST: str = 'newest'
+
+
+def get_page_obj(request, post_list, scopes=(), count=None):
+    """Страница ленты: карточки выбираются через for_feed, а число
+    постов для окна номеров считается по post_list без JOIN и
+    кэшируется под версиями scopes.
+    """
+    paginator = KeysetPaginator(
+        post_list.for_feed(), LIST_VOLUME,
+        count=count, count_list=post_list, count_scopes=scopes
+    )
+    return paginator.get_page(
+        request.GET.get('page'),
+        cursor=request.GET.get('cursor')
+    )
+
+
+def get_comments_page(request, post_id):
+    """Страница веток комментариев с первыми ответами:
+    ?order=newest — сначала новые ветки.
+    """
+    paginator = CommentPaginator(
+        Comment.objects.filter(
+            post_id=post_id, parent=None
+        ).select_related('author'),
+        COMMENTS_VOLUME,
+        ascending=request.GET.get('order') != NEWEST
+    )
+    page = paginator.get_page(cursor=request.GET.get('cursor'))
+    attach_first_replies(page.object_list)
+    return page
 
 
-@cache_page(CACHE_DELAY_SECONDS)
+@conditional_page(FEED_VERSION)
+@cache_feed(FEED_VERSION)
+@replica_reads
 def index(request):
     template = 'posts/index.html'
-    post_list = Post.objects.order_by('-pub_date')
-    paginator = Paginator(post_list, LIST_VOLUME)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.all()
+    page_obj = get_page_obj(request, post_list, (FEED_VERSION,))
     context = {'page_obj': page_obj}
     return render(request, template, context)
 
 
+@conditional_page(GROUP_VERSION)
+@cache_feed(GROUP_VERSION)
+@replica_reads
 def group_list(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.order_by('-pub_date')
-    paginator = Paginator(post_list, LIST_VOLUME)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = group.posts.all()
+    page_obj = get_page_obj(
+        request, post_list, (GROUP_VERSION.format(slug=slug),)
+    )
     template = 'posts/group_list.html'
     context = {
         'group': group,
@@ -35,41 +79,82 @@ def group_list(request, slug):
     return render(request, template, context)
 
 
+@conditional_page(AUTHOR_VERSION)
+@cache_feed(AUTHOR_VERSION)
+@replica_reads
 def profile(request, username):
     selected_user = get_object_or_404(User, username=username)
-    post_list = selected_user.posts.order_by('-pub_date')
-    count = selected_user.posts.count
-    paginator = Paginator(post_list, LIST_VOLUME)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = selected_user.posts.all()
+    stats = get_stats(selected_user)
+    page_obj = get_page_obj(request, post_list, count=stats.posts_count)
     template = 'posts/profile.html'
-    following = request.user.is_authenticated and Follow.objects.filter(
-        user=request.user,
-        author=selected_user
-    ).exists()
     context = {
         'author': selected_user,
-        'count': count,
+        'count': stats.posts_count,
+        'stats': stats,
         'page_obj': page_obj,
-        'following': following,
     }
     return render(request, template, context)
 
 
+def search(request):
+    query = clean_query(request.GET.get('q', ''))
+    page_obj = None
+    if query:
+        paginator = SearchPaginator(query, LIST_VOLUME)
+        page_obj = paginator.get_page(cursor=request.GET.get('cursor'))
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+# Лента меняется с каждым постом, в том числе с числом постов автора.
+@conditional_page(POST_VERSION, FEED_VERSION)
+@replica_reads
 def post_detail(request, post_id):
     selected_post = get_object_or_404(Post, pk=post_id)
-    count = selected_post.author.posts.count
-    comments = selected_post.comments.all()
+    count = get_stats(selected_post.author).posts_count
     context = {
         'selected_post': selected_post,
         'count': count,
         'form': CommentForm(),
-        'comments': comments,
+        'reply_to': request.GET.get('reply_to'),
+        'comments': get_comments_page(request, post_id),
+        'order': request.GET.get('order'),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@replica_reads
+def comments(request, post_id):
+    """Следующая страница комментариев HTML-фрагментом."""
+    get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    context = {
+        'post_id': post_id,
+        'comments': get_comments_page(request, post_id),
+        'order': request.GET.get('order'),
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+@replica_reads
+def comment_replies(request, post_id, comment_id):
+    """Все ответы ветки после ?after= HTML-фрагментом."""
+    comment = get_object_or_404(Comment, pk=comment_id, post_id=post_id)
+    context = {
+        'post_id': post_id,
+        'replies': subtree(comment, after=request.GET.get('after')),
+    }
+    return render(request, 'posts/includes/comment_replies.html', context)
+
+
+@stream_image_uploads
 @login_required
+@pin_primary()
+@throttle('post_create', user='5/m', ip='20/m')
+@transaction.atomic
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
@@ -81,6 +166,8 @@ def post_create(request):
     return render(request, 'posts/create_post.html', context)
 
 
+@stream_image_uploads
+@pin_primary()
 def post_edit(request, post_id):
     selected_post = get_object_or_404(Post, pk=post_id)
     if selected_post.author != request.user:
@@ -98,43 +185,60 @@ def post_edit(request, post_id):
 
 
 @login_required
+@pin_primary()
+@throttle('add_comment', user='10/m', ip='40/m')
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
+    # Отвечать можно только на комментарии того же поста.
+    parent = None
+    if request.POST.get('parent', '').isdigit():
+        parent = get_object_or_404(
+            Comment, pk=request.POST['parent'], post=post
+        )
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
+        comment.parent = parent
         comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
+@conditional_page(FEED_VERSION, viewer_version)
+@replica_reads
 def follow_index(request):
-    post_list = Post.objects.filter(
-        author__following__user=request.user
-    ).order_by('-pub_date')
-    paginator = Paginator(post_list, LIST_VOLUME)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Лента подписок меняется с каждым постом и с подписками читателя.
+    paginator = FollowFeedPaginator(request.user, LIST_VOLUME, count_scopes=(
+        FEED_VERSION,
+        AUTHOR_VERSION.format(username=request.user.get_username()),
+    ))
+    page_obj = paginator.get_page(
+        request.GET.get('page'),
+        cursor=request.GET.get('cursor')
+    )
     context = {'page_obj': page_obj}
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@pin_primary(methods=('GET', 'POST'))
+@throttle('follow', methods=('GET', 'POST'), user='30/m', ip='120/m')
+@transaction.atomic
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    if (author != request.user) and (not Follow.objects.filter(
-        user=request.user,
-        author__exact=author
-    ).exists()):
-        Follow.objects.create(user=request.user, author=author)
+    if author != request.user:
+        Follow.objects.get_or_create(user=request.user, author=author)
     return redirect('posts:profile', username)
 
 
 @login_required
+@pin_primary(methods=('GET', 'POST'))
+@throttle('follow', methods=('GET', 'POST'), user='30/m', ip='120/m')
+@transaction.atomic
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    if Follow.objects.filter(user=request.user, author=author).exists():
-        Follow.objects.filter(user=request.user, author=author).delete()
+    Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('posts:profile', username)